@@ -0,0 +1,94 @@
+"""Read throughput at different connection pool sizes.
+
+Runs concurrent threads issuing small queries against a scratch SQLite
+database (or DATABASE_URL) and reports queries per second together with
+how long checkouts waited for a connection:
+
+    python -m benchmarks.pool_sizes --threads 32 --seconds 5 --sizes 1 2 5 10 20
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from sqlalchemy import text
+from src.todo_api.config import Settings
+from src.todo_api.database import build_engine, pool_wait_stats
+
+SETUP = [
+    "CREATE TABLE IF NOT EXISTS bench (id INTEGER PRIMARY KEY, value TEXT)",
+    "DELETE FROM bench",
+]
+QUERY = text("SELECT count(*), max(value) FROM bench WHERE id % 7 = :n")
+
+
+def run(settings: Settings, threads: int, seconds: float) -> dict:
+    engine = build_engine(settings)
+    with engine.begin() as conn:
+        for statement in SETUP:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO bench (id, value) VALUES (:id, :value)"),
+            [{"id": i, "value": f"row {i}"} for i in range(10_000)],
+        )
+
+    pool_wait_stats.__init__()
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int) -> None:
+        while time.perf_counter() < deadline:
+            with engine.connect() as conn:
+                conn.execute(QUERY, {"n": index % 7}).one()
+                # Hold the connection like a request doing other work would
+                time.sleep(0.001)
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    engine.dispose()
+
+    checkouts = pool_wait_stats.checkouts or 1
+    return {
+        "pool_size": settings.pool_size,
+        "qps": sum(counts) / seconds,
+        "per_thread_stdev": statistics.pstdev(counts),
+        "mean_wait_ms": pool_wait_stats.total_seconds / checkouts * 1000,
+        "max_wait_ms": pool_wait_stats.max_seconds * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = os.getenv("DATABASE_URL", f"sqlite:///{scratch}/bench.db")
+        base = Settings.from_env()
+        print(f"{'pool':>5} {'qps':>10} {'mean wait ms':>13} {'max wait ms':>12}")
+        for size in args.sizes:
+            settings = replace(
+                base,
+                database_url=url,
+                pool_size=size,
+                max_overflow=0,
+                pool_wait_warn_ms=float("inf"),
+            )
+            result = run(settings, args.threads, args.seconds)
+            print(
+                f"{result['pool_size']:>5} {result['qps']:>10.0f} "
+                f"{result['mean_wait_ms']:>13.2f} {result['max_wait_ms']:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
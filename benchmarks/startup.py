@@ -0,0 +1,89 @@
+"""Cold start time of an API worker.
+
+Measures, over several fresh interpreters, how long importing the app takes
+and how long uvicorn takes from launch to its first successful response,
+and lists the slowest imports:
+
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from .load import _free_port, start_server, stop_server
+
+IMPORT_APP = "import src.todo_api.main"
+
+
+def import_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", IMPORT_APP], check=True, env=_env())
+    return time.perf_counter() - start
+
+
+def first_response_seconds(url: str) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = start_server(url, port, workers=1)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                try:
+                    if client.get("/metrics").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    time.sleep(0.01)
+    finally:
+        stop_server(server)
+
+
+def slowest_imports(count: int) -> list[tuple[int, str]]:
+    """(cumulative microseconds, module) of the slowest top-level imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_APP],
+        capture_output=True,
+        text=True,
+        env=_env(),
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        # Direct imports of the app's modules only, nested ones are included
+        if match and len(match.group(2)) <= 2:
+            imports.append((int(match.group(1)), match.group(3)))
+    return sorted(imports, reverse=True)[:count]
+
+
+def _env() -> dict:
+    return {**os.environ, "SECRET_KEY": os.getenv("SECRET_KEY", "benchmark")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports shown")
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    print(f"import app      median {statistics.median(imports) * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = os.getenv("DATABASE_URL", f"sqlite:///{scratch}/bench.db")
+        starts = [first_response_seconds(url) for _ in range(args.runs)]
+    print(f"first response  median {statistics.median(starts) * 1000:.0f} ms")
+
+    print("Slowest imports:")
+    for microseconds, module in slowest_imports(args.top):
+        print(f"  {microseconds / 1000:>7.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Streaming task import throughput.
+
+Feeds a generated NDJSON body through the importer into a scratch SQLite
+database (or DATABASE_URL), the way POST /tasks/import does, and reports
+rows per second:
+
+    python -m benchmarks.task_import --tasks 200000 --chunk-size 1000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from dataclasses import replace
+from sqlalchemy.orm import Session
+from src.todo_api import crud, importer
+from src.todo_api.auth_models import User
+from src.todo_api.config import Settings
+from src.todo_api.database import build_engine
+from src.todo_api.models import Base
+
+LINE = b'{"title": "Imported task", "description": "Migrated", "status": "Doing"}\n'
+
+
+async def body(count: int, lines_per_chunk: int = 1000):
+    for start in range(0, count, lines_per_chunk):
+        yield LINE * min(lines_per_chunk, count - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=importer.IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = os.getenv("DATABASE_URL", f"sqlite:///{scratch}/bench.db")
+        engine = build_engine(replace(Settings.from_env(), database_url=url))
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            user = User(
+                username="bench", email="bench@example.com", hashed_password="x"
+            )
+            db.add(user)
+            db.commit()
+
+            async def insert_chunk(tasks):
+                return crud.import_tasks(db, user.id, tasks)
+
+            start = time.perf_counter()
+            summary = asyncio.run(
+                importer.import_tasks(
+                    body(args.tasks), "ndjson", insert_chunk, args.chunk_size
+                )
+            )
+            elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    print(
+        f"{summary.accepted} tasks in {elapsed:.1f} s "
+        f"({summary.accepted / elapsed:.0f} tasks/s, chunks of {args.chunk_size})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Task list serialization: ORM objects + TaskResponse vs column tuples.
+
+Seeds one user's tasks in a scratch SQLite database and times producing the
+JSON body of a task list page both ways, database query included:
+
+    python -m benchmarks.task_list_json --tasks 5000 --limit 500 --rounds 20
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from src.todo_api import crud, fastjson
+from src.todo_api.auth_models import User
+from src.todo_api.config import Settings
+from src.todo_api.database import build_engine
+from src.todo_api.models import Base, Task, TaskStatus
+from src.todo_api.schemas import TaskResponse
+
+task_list = TypeAdapter(list[TaskResponse])
+
+
+def seed(db: Session, count: int) -> int:
+    user = User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    statuses = list(TaskStatus)
+    db.add_all(
+        Task(
+            title=f"Task {i}",
+            description="Benchmark task " * 4,
+            status=statuses[i % len(statuses)],
+            user_id=user.id,
+        )
+        for i in range(count)
+    )
+    db.commit()
+    return user.id
+
+
+def models_path(db: Session, user_id: int, limit: int) -> bytes:
+    # What FastAPI does with response_model=list[TaskResponse]
+    tasks, _ = crud.list_tasks(db, user_id, limit=limit)
+    validated = task_list.validate_python(tasks, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(db: Session, user_id: int, limit: int) -> bytes:
+    rows, _ = crud.list_tasks(db, user_id, limit=limit, columns=fastjson.TASK_COLUMNS)
+    return fastjson.dump_task_rows(rows)
+
+
+def measure(fn, db: Session, user_id: int, limit: int, rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        db.expunge_all()
+        start = time.perf_counter()
+        fn(db, user_id, limit)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = build_engine(Settings(database_url=f"sqlite:///{scratch}/bench.db"))
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            user_id = seed(db, args.tasks)
+            encoder = "orjson" if fastjson.orjson is not None else "json"
+            print(f"{args.limit} tasks per page, fast path encoder: {encoder}")
+            for name, fn in (("models", models_path), ("fast", fast_path)):
+                timings = measure(fn, db, user_id, args.limit, args.rounds)
+                print(
+                    f"{name:>7}: median {statistics.median(timings) * 1000:.2f} ms, "
+                    f"min {min(timings) * 1000:.2f} ms"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Static assets and the index page, served from memory.
+
+Files under static/ are read once, fingerprinted with a hash of their
+content and kept together with their gzip and, when the optional `brotli`
+package is installed, brotli encodings. Pages reference them through
+`StaticAssets.url` as /static/<name>.<hash>.<ext>, which browsers cache
+for a year without revalidating: a changed file gets a new name. The plain
+names keep working, revalidated through their ETag.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from .etags import etag_matches
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Smaller bodies gain nothing from compression
+MIN_COMPRESS_SIZE = 256
+
+
+@dataclass(frozen=True)
+class Asset:
+    media_type: str
+    etag: str
+    # Content-Encoding -> body, "identity" always included
+    bodies: dict[str, bytes]
+
+
+def build_asset(body: bytes, media_type: str) -> Asset:
+    """Hash and precompress a body."""
+    digest = hashlib.sha256(body).hexdigest()
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body)
+    # Only keep encodings that actually save bytes
+    bodies = {
+        encoding: encoded
+        for encoding, encoded in bodies.items()
+        if encoding == "identity" or len(encoded) < len(body)
+    }
+    return Asset(media_type, f'"{digest[:32]}"', bodies)
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """The best available encoding accepted by the client: br, gzip, identity."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        if quality and quality.replace(".", "", 1).isdigit() and float(quality) == 0:
+            continue
+        accepted.add(coding.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def asset_response(asset: Asset, request_headers: Headers, cache_control: str):
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request_headers.get("if-none-match"), asset.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(request_headers.get("accept-encoding", ""), asset.bodies)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        asset.bodies[encoding], media_type=asset.media_type, headers=headers
+    )
+
+
+class StaticAssets:
+    """An ASGI app serving the files of a directory from memory.
+
+    The directory is read on first use; files added later are not served.
+    """
+
+    def __init__(self, directory: Path, prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix
+        # Served path -> (asset, Cache-Control)
+        self._routes: dict[str, tuple[Asset, str]] | None = None
+        # Plain name -> fingerprinted name
+        self._fingerprinted: dict[str, str] = {}
+
+    def _load(self) -> dict[str, tuple[Asset, str]]:
+        if self._routes is None:
+            routes = {}
+            for path in sorted(self.directory.rglob("*")):
+                if not path.is_file():
+                    continue
+                name = path.relative_to(self.directory).as_posix()
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type.endswith("javascript"):
+                    media_type += "; charset=utf-8"
+                asset = build_asset(path.read_bytes(), media_type)
+                # style.css -> style.<hash>.css
+                stem, dot, suffix = name.rpartition(".")
+                fingerprint = asset.etag.strip('"')[:12]
+                fingerprinted = f"{stem}.{fingerprint}.{suffix}" if dot else None
+                fingerprinted = fingerprinted or f"{name}.{fingerprint}"
+                routes[name] = (asset, REVALIDATE)
+                routes[fingerprinted] = (asset, IMMUTABLE)
+                self._fingerprinted[name] = fingerprinted
+            self._routes = routes
+        return self._routes
+
+    def url(self, name: str) -> str:
+        """URL of the fingerprinted copy of a file, for use in pages."""
+        self._load()
+        return f"{self.prefix}/{self._fingerprinted[name]}"
+
+    async def __call__(self, scope, receive, send):
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        route = self._load().get(path.lstrip("/"))
+
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        elif route is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+        else:
+            asset, cache_control = route
+            response = asset_response(asset, Headers(scope=scope), cache_control)
+            if scope["method"] == "HEAD":
+                headers = dict(response.headers)
+                headers["content-length"] = str(len(response.body))
+                response = Response(status_code=response.status_code, headers=headers)
+        await response(scope, receive, send)
@@ -1,4 +1,5 @@
-from sqlalchemy import String, Boolean
+from datetime import datetime
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .models import Base
 
@@ -15,6 +16,24 @@ class User(Base):
     )
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Embedded in access tokens; bumping it invalidates every issued token
+    token_version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
     # Relationship to tasks
     tasks = relationship("Task", back_populates="owner")
+
+
+class RevokedToken(Base):
+    """Ids of tokens revoked before they expire (logout, used refresh tokens).
+
+    Rows can be purged once expired, see jobs.py.
+    """
+
+    __tablename__ = "revoked_tokens"
+
+    # Also the order in which workers pick up revocations
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    jti: Mapped[str] = mapped_column(String(36), unique=True, nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # Naive UTC, like the task timestamps
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
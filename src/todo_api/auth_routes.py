@@ -1,20 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from . import crud
 from .auth_models import User
-from .auth_schemas import UserCreate, UserLogin, UserResponse, Token
+from .auth_schemas import RefreshRequest, UserCreate, UserLogin, UserResponse, Token
 from .auth_utils import (
-    hash_password,
-    verify_password,
-    create_access_token,
+    Principal,
+    create_refresh_token,
+    create_user_access_token,
+    get_current_principal,
+    get_current_user,
+    revoke_token,
+    revoke_user_tokens,
+    verify_refresh_token,
 )
-from .auth_utils import get_current_user
-from .database import get_db
+from .database import AnySession, get_db, run_db
+from .hashing import password_hasher
 
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
 @auth_router.get("/me", response_model=UserResponse)
-def get_current_user_info(
+async def get_current_user_info(
     current_user: User = Depends(get_current_user),
 ):
     """Get the current user's information."""
@@ -22,40 +27,34 @@ def get_current_user_info(
 
 
 @auth_router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == user.username).first()
+async def register_user(user: UserCreate, db: AnySession = Depends(get_db)):
+    existing_user = await run_db(db, crud.get_user_by_username, user.username)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists",
         )
 
-    exisging_email = db.query(User).filter(User.email == user.email).first()
+    exisging_email = await run_db(db, crud.get_user_by_email, user.email)
     if exisging_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
 
-    hashed_password = hash_password(user.password)
-    new_user = User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
+    hashed_password = await password_hasher.hash(user.password)
+    new_user = await run_db(
+        db, crud.create_user, user.username, user.email, hashed_password
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
     # Return the created user without the password
     return new_user
 
 
 @auth_router.post("/login", response_model=Token)
-def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_data: UserLogin, db: AnySession = Depends(get_db)):
     # Search the user by username
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await run_db(db, crud.get_user_by_username, user_data.username)
     if not existing_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -63,14 +62,78 @@ def login_user(user_data: UserLogin, db: Session = Depends(get_db)):
         )
 
     # Verify the password
-    if not verify_password(user_data.password, existing_user.hashed_password):
+    if not await password_hasher.verify(
+        user_data.password, existing_user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password",
         )
 
     # Create a JWT Token
-    access_token = create_access_token({"sub": existing_user.username})
+    access_token = create_user_access_token(existing_user)
 
     # Return the access token
-    return Token(access_token=access_token, token_type="bearer")
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=create_refresh_token(existing_user),
+    )
+
+
+def _invalid_refresh_token(detail: str = "Invalid refresh token") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@auth_router.post("/refresh", response_model=Token)
+async def refresh_tokens(body: RefreshRequest, db: AnySession = Depends(get_db)):
+    """Exchange a refresh token for new tokens, without the password.
+
+    Each refresh token is good for one exchange. Presenting one again means
+    it leaked, so every token of the user is revoked.
+    """
+    payload = verify_refresh_token(body.refresh_token)
+    if payload is None:
+        raise _invalid_refresh_token()
+
+    user = await run_db(db, crud.get_user, payload["uid"])
+    if user is None or not user.is_active or user.token_version != payload["ver"]:
+        raise _invalid_refresh_token()
+
+    # Issued before the revocation commits and expires the user
+    tokens = Token(
+        access_token=create_user_access_token(user),
+        token_type="bearer",
+        refresh_token=create_refresh_token(user),
+    )
+    if not await revoke_token(db, payload):
+        await revoke_user_tokens(db, payload["uid"])
+        raise _invalid_refresh_token("Refresh token reused, all sessions revoked")
+    return tokens
+
+
+@auth_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_user(
+    body: RefreshRequest | None = None,
+    principal: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
+):
+    """Revoke the access token, and the refresh token if given."""
+    if principal.token_id is not None:
+        await revoke_token(
+            db,
+            {
+                "jti": principal.token_id,
+                "uid": principal.id,
+                "exp": principal.token_expires,
+            },
+        )
+    if body is not None:
+        payload = verify_refresh_token(body.refresh_token)
+        if payload is not None and payload["uid"] == principal.id:
+            await revoke_token(db, payload)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -28,3 +28,9 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: str | None = None
+
+
+# Refresh token exchange and logout schema
+class RefreshRequest(BaseModel):
+    refresh_token: str
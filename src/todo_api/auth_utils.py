@@ -1,67 +1,286 @@
-from passlib.context import CryptContext
 from jose import jwt, JWTError
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import logging
+import os
 import secrets
+import time
+import uuid
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from .database import get_db
+from . import crud, shared
+from .database import AnySession, get_db, get_read_db, run_db
 from .auth_models import User
+from .bloom import BloomFilter
+from .cache import TTLCache
 
+logger = logging.getLogger(__name__)
 
-# Configuration for password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
-SECRET_KEY = secrets.token_urlsafe(32)  # Generate a secure random secret key
+# HS256 keys shorter than this are refused rather than used
+MIN_SECRET_KEY_LENGTH = 32
+
+
+def _checked_key(key: str, source: str) -> str:
+    if len(key) < MIN_SECRET_KEY_LENGTH:
+        raise RuntimeError(
+            f"{source} must hold a signing key of at least "
+            f"{MIN_SECRET_KEY_LENGTH} characters"
+        )
+    return key
+
+
+def _read_or_create_key_file(path: Path) -> str:
+    """The key in `path`, created with a random key if missing.
+
+    The key is written to a temporary file first and published with a hard
+    link, which fails if the file exists: a concurrent reader never sees a
+    partly written file, and concurrent creators all end up with the key of
+    whichever linked first.
+    """
+    if not path.exists():
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_urlsafe(32))
+                f.flush()
+                os.fsync(f.fileno())
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            tmp.unlink()
+    return path.read_text().strip()
+
+
+def load_secret_key() -> str:
+    """The token signing key: SECRET_KEY, else the contents of SECRET_KEY_FILE,
+    else a random key kept in the shared state.
+
+    SECRET_KEY_FILE is created with a random key if it does not exist yet.
+    A key in external shared state is common to every worker but lost with
+    that state; in memory, it only lives as long as this process. Empty or
+    short keys raise RuntimeError.
+    """
+    key = os.getenv("SECRET_KEY")
+    if key is not None:
+        return _checked_key(key, "SECRET_KEY")
+    key_file = os.getenv("SECRET_KEY_FILE")
+    if key_file:
+        return _checked_key(_read_or_create_key_file(Path(key_file)), key_file)
+    if not shared.state.external:
+        logger.warning("SECRET_KEY is not set, tokens are only valid in this process")
+    return shared.secret("secret_key")
+
+
+SECRET_KEY = load_secret_key()
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token expiration time in minutes
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
 
+# user id -> current token version, for active users only. Entries are
+# dropped when the version is bumped; the TTL bounds staleness across workers.
+token_version_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60")),
+)
 
-def hash_password(password: str) -> str:
-    """Hash a password using Argon2."""
-    return pwd_context.hash(password)
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, built from token claims without loading User."""
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    id: int
+    username: str
+    # Id and expiry (epoch seconds) of the access token, for logout
+    token_id: str | None = None
+    token_expires: int | None = None
 
 
 def create_access_token(data: dict) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
 
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def verify_access_token(token: str) -> str | None:
-    """Verify a JWT access token and return the username."""
+def _user_claims(user: User) -> dict:
+    return {"sub": user.username, "uid": user.id, "ver": user.token_version}
+
+
+def create_user_access_token(user: User) -> str:
+    """Create an access token carrying the user id and token version."""
+    return create_access_token(_user_claims(user))
+
+
+def create_refresh_token(user: User) -> str:
+    """Create a long-lived token that can be exchanged once for new tokens."""
+    claims = _user_claims(user)
+    expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    claims.update({"exp": expire, "jti": str(uuid.uuid4()), "typ": "refresh"})
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _verify_token(token: str, token_type: str) -> dict | None:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        return username
     except JWTError:
         return None
+    if not isinstance(payload.get("uid"), int) or not isinstance(
+        payload.get("ver"), int
+    ):
+        return None
+    if payload.get("typ", "access") != token_type:
+        return None
+    return payload
+
+
+def verify_access_token(token: str) -> dict | None:
+    """Verify a JWT access token and return its claims."""
+    return _verify_token(token, "access")
+
+
+def verify_refresh_token(token: str) -> dict | None:
+    """Verify a refresh token and return its claims; it must still be rotated."""
+    payload = _verify_token(token, "refresh")
+    if payload is None or not isinstance(payload.get("jti"), str):
+        return None
+    return payload
+
+
+class RevocationList:
+    """Revoked token ids: a Bloom filter in front of the revoked_tokens table.
+
+    Almost no token presented was revoked, and the filter clears those
+    without a query; only filter hits are confirmed against the table.
+    Revocations made by other workers are loaded into the filter at most
+    every `sync_interval` seconds, which bounds how long a token revoked
+    elsewhere keeps working here.
+    """
+
+    def __init__(self, capacity: int, sync_interval: float):
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.clear()
+
+    def clear(self) -> None:
+        self._filter = BloomFilter(self.capacity)
+        self._last_id = 0
+        self._synced_at = float("-inf")
+
+    def add(self, jti: str) -> None:
+        """Revoked in this worker, effective here at once."""
+        self._filter.add(jti)
+
+    async def sync(self, db: AnySession) -> None:
+        self._synced_at = time.monotonic()
+        if len(self._filter) > self._filter.capacity:
+            # Rebuild rather than let the false positive rate climb; expired
+            # revocations are left out
+            self._filter = BloomFilter(max(self.capacity, 2 * len(self._filter)))
+            self._last_id = 0
+        for row_id, jti in await run_db(db, crud.list_revoked_tokens, self._last_id):
+            self._filter.add(jti)
+            self._last_id = row_id
+
+    async def is_revoked(self, db: AnySession, jti: str) -> bool:
+        if time.monotonic() - self._synced_at >= self.sync_interval:
+            await self.sync(db)
+        if jti not in self._filter:
+            return False
+        return await run_db(db, crud.is_token_revoked, jti)
+
+
+revoked_tokens = RevocationList(
+    capacity=int(os.getenv("AUTH_REVOCATION_CAPACITY", "100000")),
+    sync_interval=float(os.getenv("AUTH_REVOCATION_SYNC_SECONDS", "30")),
+)
+
+
+async def revoke_token(db: AnySession, payload: dict) -> bool:
+    """Revoke one token by its claims; False if it already was revoked."""
+    expires_at = datetime.fromtimestamp(payload["exp"], timezone.utc)
+    revoked = await run_db(
+        db, crud.revoke_token, payload["jti"], payload["uid"], expires_at
+    )
+    revoked_tokens.add(payload["jti"])
+    return revoked
+
+
+async def revoke_user_tokens(db: AnySession, user_id: int) -> None:
+    """Invalidate every token issued to a user, by id."""
+    await run_db(db, crud.bump_user_token_version, user_id)
+    token_version_cache.invalidate(user_id)
 
 
 # Security dependency to extract the token from the request
 security: HTTPBearer = HTTPBearer()
 
 
-def get_current_user(token=Depends(security), db: Session = Depends(get_db)) -> User:
-    """Get the current user from the token."""
-    username = verify_access_token(token.credentials)
+async def _current_token_version(db: AnySession, user_id: int) -> int | None:
+    """Token version of an active user, served from cache when possible."""
+    version = token_version_cache.get(user_id)
+    if version is not None:
+        return version
+    version = await run_db(db, crud.get_active_token_version, user_id)
+    if version is not None:
+        token_version_cache.set(user_id, version)
+    return version
+
 
-    if username is None:
+async def get_current_principal(
+    token=Depends(security), db: AnySession = Depends(get_db)
+) -> Principal:
+    """Get the caller from the token, hitting the database only on cache miss."""
+    payload = verify_access_token(token.credentials)
+
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.username == username).first()
+    if "jti" in payload and await revoked_tokens.is_revoked(db, payload["jti"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    current_version = await _current_token_version(db, payload["uid"])
+    if current_version is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if current_version != payload["ver"]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Principal(
+        id=payload["uid"],
+        username=payload["sub"],
+        token_id=payload.get("jti"),
+        token_expires=payload["exp"],
+    )
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_read_db),
+) -> User:
+    """Get the full User row, for routes that need more than the principal.
+
+    The row may come from a replica; the token itself was checked on the primary.
+    """
+    user = await run_db(db, crud.get_user, principal.id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
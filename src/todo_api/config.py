@@ -0,0 +1,71 @@
+import os
+from dataclasses import dataclass, fields
+
+
+def _env_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Database engine settings, read from DATABASE_* / SQLITE_* environment variables.
+
+    Every field maps to the upper-cased variable of the same name, e.g.
+    `pool_size` is read from DATABASE_POOL_SIZE.
+    """
+
+    database_url: str = "sqlite:///./todo.db"
+    # Comma-separated read replicas of database_url, for read-only dependencies
+    database_replica_urls: str = ""
+    # Serve requests through the async engine instead of the sync one on the threadpool
+    database_async: bool = False
+
+    # Connection pool (ignored for in-memory SQLite)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # Checkouts waiting longer than this for a connection are logged
+    pool_wait_warn_ms: float = 100.0
+    # Server-side statement timeout on Postgres, 0 to disable
+    statement_timeout_ms: int = 0
+    # Seconds between health checks of each replica
+    replica_health_interval: float = 10.0
+
+    # SQLite PRAGMAs applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are in KiB, as in PRAGMA cache_size
+    sqlite_cache_size: int = -64 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "Settings":
+        values = {}
+        for field in fields(cls):
+            name = field.name.upper()
+            if not name.startswith(("DATABASE_", "SQLITE_")):
+                name = f"DATABASE_{name}"
+            raw = environ.get(name)
+            if raw is None:
+                continue
+            if field.type is bool:
+                values[field.name] = _env_bool(raw)
+            else:
+                values[field.name] = field.type(raw)
+        return cls(**values)
+
+    @property
+    def replica_urls(self) -> list[str]:
+        return [
+            url.strip() for url in self.database_replica_urls.split(",") if url.strip()
+        ]
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.database_url.startswith("sqlite")
+
+
+settings = Settings.from_env()
@@ -0,0 +1,917 @@
+"""Data access for users and tasks.
+
+Every function takes a sync Session as first argument so the same code runs
+on both database stacks: directly on the threadpool with the sync engine, or
+through AsyncSession.run_sync with the async engine (see database.run_db).
+Returned objects are fully loaded so they can be serialized outside the
+session's greenlet.
+"""
+
+import html
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+from sqlalchemy import (
+    bindparam,
+    column,
+    delete,
+    func,
+    Select,
+    insert,
+    literal_column,
+    select,
+    table,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .auth_models import RevokedToken, User
+from .models import (
+    ChangeStamp,
+    SchedulerLease,
+    Task,
+    TaskCompletionBucket,
+    TaskCounter,
+    TaskStatus,
+)
+from .pagination import encode_cursor, to_naive_utc
+from .recurrence import Recurrence
+from .schemas import (
+    TaskBatch,
+    TaskBatchItemResult,
+    TaskBatchResponse,
+    TaskCompletionDay,
+    TaskCreate,
+    TaskResponse,
+    TaskStats,
+    TaskUpdate,
+)
+
+
+# Users
+
+
+def get_user(db: Session, user_id: int) -> User | None:
+    return db.get(User, user_id)
+
+
+def get_user_by_username(db: Session, username: str) -> User | None:
+    return db.query(User).filter(User.username == username).first()
+
+
+def get_user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
+
+
+def get_active_token_version(db: Session, user_id: int) -> int | None:
+    row = (
+        db.query(User.token_version)
+        .filter(User.id == user_id)
+        .filter(User.is_active.is_(True))
+        .first()
+    )
+    return None if row is None else row.token_version
+
+
+def create_user(db: Session, username: str, email: str, hashed_password: str) -> User:
+    new_user = User(
+        username=username,
+        email=email,
+        hashed_password=hashed_password,
+    )
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    return new_user
+
+
+def bump_user_token_version(db: Session, user_id: int) -> None:
+    """Invalidate every token issued to the user."""
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+    )
+    db.commit()
+
+
+# Revoked tokens
+
+
+def revoke_token(db: Session, jti: str, user_id: int, expires_at: datetime) -> bool:
+    """Record a token id as revoked; False if it already was."""
+    db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=to_naive_utc(expires_at)))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def is_token_revoked(db: Session, jti: str) -> bool:
+    return db.scalar(select(RevokedToken.id).where(RevokedToken.jti == jti)) is not None
+
+
+def list_revoked_tokens(db: Session, after_id: int) -> list[tuple[int, str]]:
+    """(id, jti) of the unexpired revocations recorded after `after_id`."""
+    now = to_naive_utc(datetime.now(timezone.utc))
+    return db.execute(
+        select(RevokedToken.id, RevokedToken.jti)
+        .where(RevokedToken.id > after_id)
+        .where(RevokedToken.expires_at > now)
+        .order_by(RevokedToken.id)
+    ).all()
+
+
+def purge_revoked_tokens(db: Session) -> int:
+    """Delete revocations of tokens that have expired anyway."""
+    now = to_naive_utc(datetime.now(timezone.utc))
+    purged = db.execute(
+        delete(RevokedToken).where(RevokedToken.expires_at <= now)
+    ).rowcount
+    db.commit()
+    return purged
+
+
+# Change stamps
+
+
+def get_change_seq(db: Session, user_id: int) -> int:
+    """Current value of the user's task change counter (0 if never written)."""
+    seq = db.scalar(select(ChangeStamp.seq).where(ChangeStamp.user_id == user_id))
+    return seq or 0
+
+
+def bump_change_seq(db: Session, user_id: int) -> int:
+    """Advance the user's task change counter within the current transaction."""
+    now = to_naive_utc(datetime.now(timezone.utc))
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # Imported here, loading every Postgres dialect slows down startup
+        from sqlalchemy.dialects import postgresql, sqlite
+
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(ChangeStamp).values(
+            user_id=user_id, seq=1, changed_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChangeStamp.user_id],
+            set_={"seq": ChangeStamp.seq + 1, "changed_at": now},
+        )
+        return db.scalar(stmt.returning(ChangeStamp.seq))
+
+    updated = db.execute(
+        update(ChangeStamp)
+        .where(ChangeStamp.user_id == user_id)
+        .values(seq=ChangeStamp.seq + 1, changed_at=now)
+    ).rowcount
+    if not updated:
+        db.add(ChangeStamp(user_id=user_id, seq=1, changed_at=now))
+        db.flush()
+    return get_change_seq(db, user_id)
+
+
+# Tasks
+
+
+def _live():
+    """Criterion excluding tombstones of deleted tasks."""
+    return Task.deleted_at.is_(None)
+
+
+def list_tasks(
+    db: Session,
+    user_id: int,
+    *,
+    limit: int,
+    after: tuple[datetime, int] | None = None,
+    status: TaskStatus | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    updated_after: datetime | None = None,
+    updated_before: datetime | None = None,
+    columns: Sequence | None = None,
+) -> tuple[list[Task], str | None]:
+    """Return one page of tasks, most recently updated first, and the next cursor.
+
+    `after` is the decoded (updated_at, id) position the page starts after.
+    With `columns`, rows of just those columns are returned instead of Task
+    objects; they must include Task.updated_at and Task.id.
+    """
+    query = db.query(*columns) if columns else db.query(Task)
+    query = query.filter(Task.user_id == user_id).filter(_live())
+    if status is not None:
+        query = query.filter(Task.status == status)
+    if created_after is not None:
+        query = query.filter(Task.created_at >= to_naive_utc(created_after))
+    if created_before is not None:
+        query = query.filter(Task.created_at < to_naive_utc(created_before))
+    if updated_after is not None:
+        query = query.filter(Task.updated_at >= to_naive_utc(updated_after))
+    if updated_before is not None:
+        query = query.filter(Task.updated_at < to_naive_utc(updated_before))
+    if after is not None:
+        query = query.filter(tuple_(Task.updated_at, Task.id) < tuple_(*after))
+
+    # Fetch one extra row to know whether another page exists
+    tasks = (
+        query.order_by(Task.updated_at.desc(), Task.id.desc()).limit(limit + 1).all()
+    )
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, encode_cursor(tasks[-1].updated_at, tasks[-1].id)
+
+
+def export_tasks_query(user_id: int, columns: Sequence) -> Select:
+    """All of a user's live tasks in id order, for streaming with yield_per.
+
+    Unlike the functions above this only builds the statement: streaming
+    responses execute it on their own session, outside of run_db.
+    """
+    return (
+        select(*columns).where(Task.user_id == user_id).where(_live()).order_by(Task.id)
+    )
+
+
+def get_task(db: Session, user_id: int, task_id: int) -> Task | None:
+    return (
+        db.query(Task)
+        .filter(Task.id == task_id)
+        .filter(Task.user_id == user_id)
+        .filter(_live())
+        .first()
+    )
+
+
+def create_task(db: Session, user_id: int, task: TaskCreate) -> Task:
+    db_task = Task(
+        title=task.title,
+        description=task.description,
+        status=task.status,
+        due_at=task.due_at,
+        remind_at=task.remind_at,
+        recurrence=task.recurrence,
+        user_id=user_id,
+        change_seq=bump_change_seq(db, user_id),
+    )
+    db.add(db_task)
+    db.commit()
+    db.refresh(db_task)
+    return db_task
+
+
+class VersionConflictError(Exception):
+    """The task exists but its version does not match the expected one."""
+
+
+class RecurrenceWithoutDueError(Exception):
+    """The update would leave a recurring task without a due_at."""
+
+
+def _orphans_recurrence(values: dict, task) -> bool:
+    """Whether writing `values` over the task leaves it recurring without a due_at."""
+    due_at = values.get("due_at", task.due_at)
+    recurrence = values.get("recurrence", task.recurrence)
+    return recurrence is not None and due_at is None
+
+
+def _recurrence_guard(values: dict):
+    """Condition on the stored row for `values` not to orphan its recurrence.
+
+    None when the update decides it alone, see TaskUpdate.check_recurrence.
+    """
+    if values.get("recurrence") is not None and "due_at" not in values:
+        return Task.due_at.is_not(None)
+    if "due_at" in values and values["due_at"] is None and "recurrence" not in values:
+        return Task.recurrence.is_(None)
+    return None
+
+
+def _write_missed(
+    db: Session, user_id: int, task_id: int, values: dict | None = None
+) -> None:
+    """Undo the change stamp bump of a write that matched no row, and explain it.
+
+    `values` are those of an update, which also misses a task whose
+    recurrence it would orphan.
+    """
+    db.rollback()
+    task = get_task(db, user_id, task_id)
+    if task is None:
+        return
+    if values is not None and _orphans_recurrence(values, task):
+        raise RecurrenceWithoutDueError(task_id)
+    raise VersionConflictError(task_id)
+
+
+def update_task(
+    db: Session,
+    user_id: int,
+    task_id: int,
+    task_update: TaskUpdate,
+    expected_version: int | None = None,
+) -> TaskResponse | None:
+    """Update a task in a single ownership-scoped UPDATE ... RETURNING.
+
+    With `expected_version`, the update only applies if the task is still at
+    that version, otherwise VersionConflictError is raised. An update that
+    would leave the task recurring without a due_at raises
+    RecurrenceWithoutDueError.
+    """
+    values = task_update.values()
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id)
+        .where(Task.user_id == user_id)
+        .where(_live())
+        .values(
+            **values,
+            version=Task.version + 1,
+            change_seq=bump_change_seq(db, user_id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Task.version == expected_version)
+    # Checked by the UPDATE itself, which keeps it a single statement
+    guard = _recurrence_guard(values)
+    if guard is not None:
+        stmt = stmt.where(guard)
+
+    if db.get_bind().dialect.update_returning:
+        db_task = db.scalars(stmt.returning(Task)).first()
+    else:
+        db_task = get_task(db, user_id, task_id) if db.execute(stmt).rowcount else None
+
+    if db_task is None:
+        _write_missed(db, user_id, task_id, values)
+        return None
+    # Serialize before commit expires the instance
+    task = TaskResponse.model_validate(db_task)
+    db.commit()
+    return task
+
+
+def delete_task(
+    db: Session, user_id: int, task_id: int, expected_version: int | None = None
+) -> bool:
+    """Turn a task into a tombstone in a single ownership-scoped UPDATE."""
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id)
+        .where(Task.user_id == user_id)
+        .where(_live())
+        .values(
+            deleted_at=to_naive_utc(datetime.now(timezone.utc)),
+            version=Task.version + 1,
+            change_seq=bump_change_seq(db, user_id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Task.version == expected_version)
+
+    if db.get_bind().dialect.update_returning:
+        deleted = db.scalars(stmt.returning(Task.id)).first() is not None
+    else:
+        deleted = db.execute(stmt).rowcount == 1
+
+    if not deleted:
+        _write_missed(db, user_id, task_id)
+        return False
+    db.commit()
+    return True
+
+
+def apply_task_batch(db: Session, user_id: int, batch: TaskBatch) -> TaskBatchResponse:
+    """Apply a batch of creates, updates and deletes in a single transaction.
+
+    Each kind of operation is one set-based statement regardless of batch
+    size, updates one per set of updated fields. Updates and deletes are
+    scoped to the user's live tasks; ids that do not exist, belong to someone
+    else or were deleted concurrently are reported as not found. The whole batch
+    shares one change_seq, and is rejected with RecurrenceWithoutDueError if
+    an update would leave a recurring task without a due_at.
+    """
+    change_seq = bump_change_seq(db, user_id)
+
+    created = []
+    if batch.create:
+        created_tasks = db.scalars(
+            insert(Task).returning(Task, sort_by_parameter_order=True),
+            [
+                {
+                    "title": item.title,
+                    "description": item.description,
+                    "status": item.status,
+                    "due_at": item.due_at,
+                    "remind_at": item.remind_at,
+                    "recurrence": item.recurrence,
+                    "user_id": user_id,
+                    "change_seq": change_seq,
+                }
+                for item in batch.create
+            ],
+        ).all()
+        created = [
+            TaskBatchItemResult(
+                id=task.id, result="created", task=TaskResponse.model_validate(task)
+            )
+            for task in created_tasks
+        ]
+
+    updated, updated_tasks = [], {}
+    if batch.update:
+        owned = {
+            task.id: task
+            for task in db.execute(
+                select(Task.id, Task.due_at, Task.recurrence)
+                .where(Task.user_id == user_id)
+                .where(_live())
+                .where(Task.id.in_([item.id for item in batch.update]))
+            )
+        }
+        values = {item.id: item.values() for item in batch.update if item.id in owned}
+        orphaned = [
+            task_id
+            for task_id, task_values in values.items()
+            if _orphans_recurrence(task_values, owned[task_id])
+        ]
+        if orphaned:
+            db.rollback()
+            raise RecurrenceWithoutDueError(*orphaned)
+
+        # One executemany per set of updated columns. The version is bumped
+        # and ownership re-checked by the UPDATE itself, so a task changed or
+        # deleted since the SELECT above is neither overwritten blindly nor
+        # brought back.
+        by_columns: dict[frozenset, list[dict]] = {}
+        for task_id, task_values in values.items():
+            by_columns.setdefault(frozenset(task_values), []).append(
+                {"task_id": task_id, **task_values}
+            )
+        tasks = Task.__table__
+        for rows in by_columns.values():
+            db.execute(
+                update(tasks)
+                .where(tasks.c.id == bindparam("task_id"))
+                .where(tasks.c.user_id == user_id)
+                .where(tasks.c.deleted_at.is_(None))
+                .values(version=tasks.c.version + 1, change_seq=change_seq),
+                rows,
+            )
+        # What the UPDATEs matched carries this batch's change_seq
+        if values:
+            updated_tasks = {
+                task.id: TaskResponse.model_validate(task)
+                for task in db.scalars(
+                    select(Task)
+                    .where(Task.id.in_(values))
+                    .where(Task.change_seq == change_seq)
+                    .where(_live())
+                    .execution_options(populate_existing=True)
+                )
+            }
+        updated = [
+            TaskBatchItemResult(
+                id=item.id, result="updated", task=updated_tasks[item.id]
+            )
+            if item.id in updated_tasks
+            else TaskBatchItemResult(id=item.id, result="not_found")
+            for item in batch.update
+        ]
+
+    deleted, deleted_ids = [], set()
+    if batch.delete:
+        deleted_ids = set(
+            db.scalars(
+                update(Task)
+                .where(Task.user_id == user_id)
+                .where(_live())
+                .where(Task.id.in_(batch.delete))
+                .values(
+                    deleted_at=to_naive_utc(datetime.now(timezone.utc)),
+                    version=Task.version + 1,
+                    change_seq=change_seq,
+                )
+                .returning(Task.id)
+                .execution_options(synchronize_session=False)
+            )
+        )
+        deleted = [
+            TaskBatchItemResult(
+                id=task_id,
+                result="deleted" if task_id in deleted_ids else "not_found",
+            )
+            for task_id in batch.delete
+        ]
+
+    if created or updated_tasks or deleted_ids:
+        db.commit()
+    else:
+        # Nothing was written, leave the change stamp alone
+        db.rollback()
+    return TaskBatchResponse(create=created, update=updated, delete=deleted)
+
+
+def import_tasks(db: Session, user_id: int, tasks: list[TaskCreate]) -> int:
+    """Insert one chunk of imported tasks in its own transaction.
+
+    A plain executemany without RETURNING, which the drivers batch into
+    multi-row inserts. The chunk shares one change_seq.
+    """
+    change_seq = bump_change_seq(db, user_id)
+    db.execute(
+        insert(Task.__table__),
+        [
+            {
+                "title": task.title,
+                "description": task.description,
+                "status": task.status,
+                "due_at": task.due_at,
+                "remind_at": task.remind_at,
+                "recurrence": task.recurrence,
+                "user_id": user_id,
+                "change_seq": change_seq,
+            }
+            for task in tasks
+        ],
+    )
+    db.commit()
+    return len(tasks)
+
+
+# Scheduling
+
+
+def pending_schedule(
+    db: Session, until: datetime, limit: int
+) -> tuple[list[tuple[datetime, int]], list[tuple[datetime, int]]]:
+    """Pending reminders and recurring tasks due by `until`.
+
+    (time, task id) pairs, earliest first and at most `limit` of each, read
+    from the partial indexes that only hold pending work.
+    """
+    reminders = db.execute(
+        select(Task.remind_at, Task.id)
+        .where(Task.remind_at <= until)
+        .where(Task.reminded_at.is_(None))
+        .where(_live())
+        .order_by(Task.remind_at)
+        .limit(limit)
+    ).all()
+    recurring = db.execute(
+        select(Task.due_at, Task.id)
+        .where(Task.due_at <= until)
+        .where(Task.recurrence.is_not(None))
+        .where(_live())
+        .order_by(Task.due_at)
+        .limit(limit)
+    ).all()
+    return [tuple(row) for row in reminders], [tuple(row) for row in recurring]
+
+
+def fire_reminders(
+    db: Session, task_ids: list[int], now: datetime
+) -> list[tuple[int, TaskResponse]]:
+    """Mark the reminders of these tasks that are still due as sent.
+
+    Returns (user id, task) for each of them; tasks whose reminder was moved,
+    already sent or deleted in the meantime are left out.
+    """
+    db_tasks = db.scalars(
+        update(Task)
+        .where(Task.id.in_(task_ids))
+        .where(Task.remind_at <= now)
+        .where(Task.reminded_at.is_(None))
+        .where(_live())
+        # Sending a reminder does not change the task as clients see it,
+        # which keeps its updated_at, ETags and change feed position
+        .values(reminded_at=now, updated_at=Task.updated_at)
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    ).all()
+    fired = [(task.user_id, TaskResponse.model_validate(task)) for task in db_tasks]
+    db.commit()
+    return fired
+
+
+def spawn_recurrences(
+    db: Session, task_ids: list[int], now: datetime
+) -> list[tuple[int, TaskResponse]]:
+    """Create the next occurrence of these recurring tasks that are due.
+
+    The next occurrence takes over the rest of the rule and the reminder
+    offset; the task it follows keeps its due date and loses its rule, so it
+    is only spawned once. Returns (user id, task) for each created task.
+    """
+    due = db.execute(
+        select(
+            Task.id,
+            Task.user_id,
+            Task.title,
+            Task.description,
+            Task.due_at,
+            Task.remind_at,
+            Task.recurrence,
+        )
+        .where(Task.id.in_(task_ids))
+        .where(Task.due_at <= now)
+        .where(Task.recurrence.is_not(None))
+        .where(_live())
+    ).all()
+    if not due:
+        db.rollback()
+        return []
+
+    change_seqs = {}
+    for user_id in sorted({task.user_id for task in due}):
+        change_seqs[user_id] = bump_change_seq(db, user_id)
+        db.execute(
+            update(Task)
+            .where(Task.id.in_([task.id for task in due if task.user_id == user_id]))
+            .values(
+                recurrence=None,
+                version=Task.version + 1,
+                change_seq=change_seqs[user_id],
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    occurrences = []
+    for task in due:
+        following = Recurrence.parse(task.recurrence).next_after(task.due_at, now)
+        if following is None:
+            continue
+        due_at, rest = following
+        remind_at = None
+        if task.remind_at is not None:
+            remind_at = due_at - (task.due_at - task.remind_at)
+        occurrences.append(
+            {
+                "title": task.title,
+                "description": task.description,
+                "status": TaskStatus.TODO,
+                "due_at": due_at,
+                "remind_at": remind_at,
+                "recurrence": str(rest) if rest else None,
+                "user_id": task.user_id,
+                "change_seq": change_seqs[task.user_id],
+            }
+        )
+    created = []
+    if occurrences:
+        created = [
+            (task.user_id, TaskResponse.model_validate(task))
+            for task in db.scalars(
+                insert(Task).returning(Task, sort_by_parameter_order=True),
+                occurrences,
+            )
+        ]
+    db.commit()
+    return created
+
+
+def acquire_lease(
+    db: Session, name: str, owner: str, now: datetime, ttl: timedelta
+) -> bool:
+    """Take or renew the named lease for `ttl`, unless another owner holds it."""
+    renewed = db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name)
+        .where((SchedulerLease.owner == owner) | (SchedulerLease.expires_at <= now))
+        .values(owner=owner, expires_at=now + ttl)
+    ).rowcount
+    if renewed:
+        db.commit()
+        return True
+    if db.get(SchedulerLease, name) is not None:
+        db.rollback()
+        return False
+    db.add(SchedulerLease(name=name, owner=owner, expires_at=now + ttl))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process created it first
+        db.rollback()
+        return False
+    return True
+
+
+def release_lease(db: Session, name: str, owner: str) -> None:
+    """Give up the named lease if `owner` holds it."""
+    db.execute(
+        delete(SchedulerLease)
+        .where(SchedulerLease.name == name)
+        .where(SchedulerLease.owner == owner)
+    )
+    db.commit()
+
+
+# Search
+
+# Lightweight handle on the SQLite FTS5 table created next to `tasks`
+_tasks_fts = table("tasks_fts", column("rowid"))
+# Matches are delimited with private use characters, which survive escaping
+_HIGHLIGHT_START, _HIGHLIGHT_STOP = "\ue000", "\ue001"
+
+
+def _mark_highlights(text: str | None) -> str:
+    """Escape highlighted task text for HTML and wrap matches in <mark>."""
+    return (
+        html.escape(text or "")
+        .replace(_HIGHLIGHT_START, "<mark>")
+        .replace(_HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def _fts5_query(q: str) -> str:
+    """Quote each word so user input is never parsed as FTS5 query syntax."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in q.split())
+
+
+def search_tasks(
+    db: Session,
+    user_id: int,
+    q: str,
+    *,
+    limit: int,
+    status: TaskStatus | None = None,
+) -> list[tuple[Task, float, str, str]]:
+    """Full-text search of the user's tasks, best match first.
+
+    Returns (task, rank, highlighted title, highlighted description snippet)
+    tuples; higher ranks are better matches. Highlights are HTML: the task
+    text is escaped and only the <mark> tags around matches are markup.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", q)
+        search_vector = literal_column("tasks.search_vector")
+        options = f'StartSel="{_HIGHLIGHT_START}", StopSel="{_HIGHLIGHT_STOP}"'
+        rank = func.ts_rank_cd(search_vector, ts_query)
+        stmt = select(
+            Task,
+            rank.label("rank"),
+            func.ts_headline(
+                "english", Task.title, ts_query, options + ", HighlightAll=true"
+            ).label("title_highlight"),
+            func.ts_headline(
+                "english", func.coalesce(Task.description, ""), ts_query, options
+            ).label("description_highlight"),
+        ).where(search_vector.op("@@")(ts_query))
+        order = rank.desc()
+    elif dialect == "sqlite":
+        fts = literal_column("tasks_fts")
+        # bm25 is lower for better matches; title hits weigh more
+        rank = func.bm25(fts, 10.0, 1.0)
+        stmt = (
+            select(
+                Task,
+                (-rank).label("rank"),
+                func.highlight(fts, 0, _HIGHLIGHT_START, _HIGHLIGHT_STOP).label(
+                    "title_highlight"
+                ),
+                func.snippet(fts, 1, _HIGHLIGHT_START, _HIGHLIGHT_STOP, "…", 16).label(
+                    "description_highlight"
+                ),
+            )
+            .join(_tasks_fts, _tasks_fts.c.rowid == Task.id)
+            .where(fts.op("MATCH")(_fts5_query(q)))
+        )
+        order = rank
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    stmt = stmt.where(Task.user_id == user_id).where(_live())
+    if status is not None:
+        stmt = stmt.where(Task.status == status)
+    return [
+        (task, rank, _mark_highlights(title), _mark_highlights(description))
+        for task, rank, title, description in db.execute(
+            stmt.order_by(order).limit(limit)
+        )
+    ]
+
+
+# Delta sync
+
+
+def get_purged_seq(db: Session, user_id: int) -> int:
+    """change_seq horizon below which the user's tombstones may be gone."""
+    seq = db.scalar(
+        select(ChangeStamp.purged_seq).where(ChangeStamp.user_id == user_id)
+    )
+    return seq or 0
+
+
+def list_changes(
+    db: Session, user_id: int, *, after: tuple[int, int], limit: int
+) -> tuple[list[Task], bool]:
+    """Tasks, tombstones included, changed after the (change_seq, id) position.
+
+    Returns the page in change order and whether more changes remain.
+    """
+    tasks = db.scalars(
+        select(Task)
+        .where(Task.user_id == user_id)
+        .where(tuple_(Task.change_seq, Task.id) > tuple_(*after))
+        .order_by(Task.change_seq, Task.id)
+        .limit(limit + 1)
+    ).all()
+    return tasks[:limit], len(tasks) > limit
+
+
+def purge_tombstones(db: Session, deleted_before: datetime) -> int:
+    """Purge tombstones of tasks deleted before the cutoff.
+
+    Each affected user's purged_seq is raised first so that sync cursors
+    older than the purged tombstones are refused instead of silently
+    missing deletions.
+    """
+    deleted_before = to_naive_utc(deleted_before)
+    horizons = db.execute(
+        select(Task.user_id, func.max(Task.change_seq))
+        .where(Task.deleted_at < deleted_before)
+        .group_by(Task.user_id)
+    ).all()
+    if not horizons:
+        return 0
+    db.execute(
+        update(ChangeStamp),
+        [{"user_id": user_id, "purged_seq": seq} for user_id, seq in horizons],
+    )
+    purged = db.execute(
+        delete(Task)
+        .where(Task.deleted_at < deleted_before)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return purged
+
+
+# Stats
+
+
+def get_task_stats(db: Session, user_id: int, days: int) -> TaskStats:
+    """Counts per status and daily completions over the last `days` days.
+
+    Both come from trigger-maintained counters, so the cost does not depend
+    on how many tasks the user has.
+    """
+    counts = dict(
+        db.execute(
+            select(TaskCounter.status, TaskCounter.count).where(
+                TaskCounter.user_id == user_id
+            )
+        ).all()
+    )
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=days - 1)
+    completions = dict(
+        db.execute(
+            select(TaskCompletionBucket.day, TaskCompletionBucket.count)
+            .where(TaskCompletionBucket.user_id == user_id)
+            .where(TaskCompletionBucket.day >= first_day)
+        ).all()
+    )
+    by_status = {status: counts.get(status, 0) for status in TaskStatus}
+    return TaskStats(
+        total=sum(by_status.values()),
+        by_status=by_status,
+        completed=[
+            TaskCompletionDay(day=day, count=completions.get(day, 0))
+            for day in (first_day + timedelta(days=i) for i in range(days))
+        ],
+    )
+
+
+def reconcile_task_counters(db: Session, user_id: int | None = None) -> int:
+    """Rebuild the status counters from the tasks table, for one or all users.
+
+    Completion buckets record events rather than state and are left as is.
+    Returns the number of counter rows written.
+    """
+    live_counts = (
+        select(Task.user_id, Task.status, func.count())
+        .where(_live())
+        .group_by(Task.user_id, Task.status)
+    )
+    stale = delete(TaskCounter)
+    if user_id is not None:
+        live_counts = live_counts.where(Task.user_id == user_id)
+        stale = stale.where(TaskCounter.user_id == user_id)
+    rows = db.execute(live_counts).all()
+    db.execute(stale)
+    if rows:
+        db.execute(
+            insert(TaskCounter),
+            [
+                {"user_id": row_user_id, "status": status, "count": count}
+                for row_user_id, status, count in rows
+            ],
+        )
+    db.commit()
+    return len(rows)
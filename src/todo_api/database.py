@@ -1,27 +1,454 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import itertools
+import logging
+import threading
+import time
+from dataclasses import replace
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Delete, Insert, Update
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from . import metrics
+from .config import Settings, settings
 from .models import Base
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./todo.db")
+logger = logging.getLogger(__name__)
 
-if DATABASE_URL.startswith("sqlite:///"):
-    # For SQLite, we need to set check_same_thread=False
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # For other databases, we can use the default connection arguments
-    engine = create_engine(DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class PoolWaitStats:
+    """How long checkouts waited for a pooled connection."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, warn_seconds: float) -> None:
+        self.checkouts += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if seconds >= warn_seconds:
+            logger.warning("Waited %.1f ms for a database connection", seconds * 1000)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class _TimedCheckout:
+    """Mixin timing how long the pool takes to hand out a connection."""
+
+    wait_warn_seconds = float("inf")
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - start, self.wait_warn_seconds)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.endswith("://"))
+
+
+def _engine_options(config: Settings, pool_class) -> dict:
+    if _is_memory_sqlite(config.database_url):
+        # In-memory databases live and die with their single connection
+        return {}
+    pool_class = type(
+        pool_class.__name__,
+        (pool_class,),
+        {"wait_warn_seconds": config.pool_wait_warn_ms / 1000},
+    )
+    return {
+        "poolclass": pool_class,
+        "pool_size": config.pool_size,
+        "max_overflow": config.max_overflow,
+        "pool_timeout": config.pool_timeout,
+        "pool_recycle": config.pool_recycle,
+        "pool_pre_ping": config.pool_pre_ping,
+    }
+
+
+def _install_sqlite_pragmas(engine: Engine, config: Settings) -> None:
+    pragmas = {
+        "journal_mode": config.sqlite_journal_mode,
+        "synchronous": config.sqlite_synchronous,
+        "mmap_size": config.sqlite_mmap_size,
+        "cache_size": config.sqlite_cache_size,
+        "busy_timeout": config.sqlite_busy_timeout_ms,
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def build_engine(config: Settings) -> Engine:
+    """Create the sync engine described by the settings."""
+    connect_args = {}
+    if config.is_sqlite:
+        # For SQLite, we need to set check_same_thread=False
+        connect_args["check_same_thread"] = False
+    elif config.statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={config.statement_timeout_ms}"
+
+    engine = create_engine(
+        config.database_url,
+        connect_args=connect_args,
+        **_engine_options(config, TimedQueuePool),
+    )
+    if config.is_sqlite:
+        _install_sqlite_pragmas(engine, config)
+    metrics.instrument_engine(engine)
+    return engine
+
+
+def to_async_url(url: str) -> str:
+    """Swap a sync database URL's driver for its asyncio counterpart."""
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if backend in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def build_async_engine(config: Settings) -> AsyncEngine:
+    """Create the async engine described by the settings."""
+    connect_args = {}
+    if not config.is_sqlite and config.statement_timeout_ms:
+        connect_args["server_settings"] = {
+            "statement_timeout": str(config.statement_timeout_ms)
+        }
+
+    engine = create_async_engine(
+        to_async_url(config.database_url),
+        connect_args=connect_args,
+        **_engine_options(config, TimedAsyncQueuePool),
+    )
+    if config.is_sqlite:
+        _install_sqlite_pragmas(engine.sync_engine, config)
+    metrics.instrument_engine(engine.sync_engine)
+    return engine
+
+
+class ReplicaSet:
+    """Round-robin over replica engines, skipping those failing health checks.
+
+    A replica is checked with `SELECT 1` at most once per `health_interval`
+    seconds, when its turn comes up; a failed replica sits out until its next
+    check.
+    """
+
+    def __init__(self, engines: list[Engine], health_interval: float = 10.0):
+        self.engines = engines
+        self.health_interval = health_interval
+        self._turns = itertools.cycle(range(len(engines)))
+        self._healthy = [True] * len(engines)
+        self._checked_at = [float("-inf")] * len(engines)
+        self._lock = threading.Lock()
+
+    def _check(self, index: int) -> bool:
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            logger.warning("Replica %s failed its health check", index, exc_info=True)
+            return False
+
+    def pick(self) -> Engine | None:
+        """The next healthy replica, or None when all of them are down."""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._turns)
+                now = time.monotonic()
+                due = now - self._checked_at[index] >= self.health_interval
+                if due:
+                    self._checked_at[index] = now
+            if due:
+                self._healthy[index] = self._check(index)
+            if self._healthy[index]:
+                return self.engines[index]
+        return None
+
+
+class RoutingSession(Session):
+    """Sends reads to a replica when the session is marked read-only.
+
+    Writes always go to the primary, and once a session has written, its later
+    reads stay on the primary too so they see their own changes.
+    """
+
+    def __init__(self, *args, replicas: ReplicaSet | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self._replica: Engine | None = None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self._wrote = True
+        if self._wrote or self.replicas is None or not self.info.get("read_only"):
+            return primary
+        # Stick to one replica so a session reads a consistent snapshot
+        if self._replica is None:
+            self._replica = self.replicas.pick()
+        return self._replica or primary
+
+
+def build_replicas(engines: list, config: Settings) -> ReplicaSet | None:
+    if not engines:
+        return None
+    return ReplicaSet(
+        [getattr(engine, "sync_engine", engine) for engine in engines],
+        health_interval=config.replica_health_interval,
+    )
+
+
+def _replica_settings(config: Settings) -> list[Settings]:
+    return [replace(config, database_url=url) for url in config.replica_urls]
+
+
+# What get_db yields, depending on DATABASE_ASYNC
+AnySession = Session | AsyncSession
+
+# Built by configure(); creating engines does not connect yet
+engine: Engine
+replica_engines: list[Engine]
+SessionLocal: sessionmaker
+async_engine: AsyncEngine | None
+async_replica_engines: list[AsyncEngine]
+AsyncSessionLocal: async_sessionmaker | None
+config: Settings
+
+
+def _drop_engines() -> None:
+    """Dispose of the engines built by a previous configure(), if any."""
+    if "engine" not in globals():
+        return
+    for sync_engine in (engine, *replica_engines):
+        sync_engine.dispose()
+    # Closing async connections needs their event loop, which is gone or not
+    # running here: the pools are dropped and the connections left to gc
+    for target in (async_engine, *async_replica_engines):
+        if target is not None:
+            target.sync_engine.dispose(close=False)
+
+
+def configure(new_config: Settings) -> None:
+    """(Re)build the engines and session factories for the settings.
+
+    The previous engines, if any, are disposed of first.
+    """
+    global engine, replica_engines, SessionLocal, config
+    global async_engine, async_replica_engines, AsyncSessionLocal
+    _drop_engines()
+    config = new_config
+    engine = build_engine(config)
+    replica_engines = [build_engine(replica) for replica in _replica_settings(config)]
+    SessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        class_=RoutingSession,
+        replicas=build_replicas(replica_engines, config),
+    )
+
+    if config.database_async:
+        async_engine = build_async_engine(config)
+        async_replica_engines = [
+            build_async_engine(replica) for replica in _replica_settings(config)
+        ]
+        # Objects are serialized after the session's greenlet returns, so they
+        # must stay loaded after commit
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine,
+            autoflush=False,
+            expire_on_commit=False,
+            sync_session_class=RoutingSession,
+            replicas=build_replicas(async_replica_engines, config),
+        )
+    else:
+        async_engine = None
+        async_replica_engines = []
+        AsyncSessionLocal = None
+
+
+configure(settings)
+
+
+def _queue_pools():
+    engines = {"primary": engine, "async_primary": async_engine}
+    engines.update((f"replica_{i}", e) for i, e in enumerate(replica_engines))
+    engines.update(
+        (f"async_replica_{i}", e) for i, e in enumerate(async_replica_engines)
+    )
+    for name, target in engines.items():
+        if target is not None and isinstance(target.pool, QueuePool):
+            yield name, target.pool
+
+
+metrics.registry.collected(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool.",
+    "gauge",
+    lambda: [({"engine": name}, pool.checkedout()) for name, pool in _queue_pools()],
+)
+metrics.registry.collected(
+    "db_pool_overflow",
+    "Connections open beyond pool_size.",
+    "gauge",
+    lambda: [
+        ({"engine": name}, max(pool.overflow(), 0)) for name, pool in _queue_pools()
+    ],
+)
+metrics.registry.collected(
+    "db_pool_size",
+    "Configured pool size.",
+    "gauge",
+    lambda: [({"engine": name}, pool.size()) for name, pool in _queue_pools()],
+)
+metrics.registry.collected(
+    "db_pool_checkouts_total",
+    "Connections handed out by the pools.",
+    "counter",
+    lambda: [({}, pool_wait_stats.checkouts)],
+)
+metrics.registry.collected(
+    "db_pool_checkout_wait_seconds_total",
+    "Time spent waiting for pooled connections.",
+    "counter",
+    lambda: [({}, pool_wait_stats.total_seconds)],
+)
+
+
+async def dispose_engines() -> None:
+    """Close pooled connections on shutdown, primary and replicas alike."""
+    for sync_engine in (engine, *replica_engines):
+        sync_engine.dispose()
+    if async_engine is not None:
+        for target in (async_engine, *async_replica_engines):
+            await target.dispose()
 
 
 def create_tables():
+    """Create missing tables, triggers and indexes; see `jobs.py migrate`."""
     Base.metadata.create_all(bind=engine)
 
 
-def get_db():
+def _warm(target: Engine, connections: int) -> None:
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = target.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+async def warm_pools() -> None:
+    """Open the primary's pooled connections ahead of the first requests.
+
+    Fails fast when the database is unreachable, instead of on the first
+    request. Replicas are left to their health checks, and engines without
+    a queue pool (in-memory SQLite) are skipped.
+    """
+    connections = config.pool_size
+    if async_engine is None:
+        if isinstance(engine.pool, QueuePool):
+            await run_in_threadpool(_warm, engine, connections)
+    elif isinstance(async_engine.pool, QueuePool):
+        opened = []
+        try:
+            for _ in range(connections):
+                conn = await async_engine.connect()
+                opened.append(conn)
+                await conn.execute(text("SELECT 1"))
+        finally:
+            for conn in opened:
+                await conn.close()
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+
+async def get_read_db():
+    """Like get_db, but reads may be served by a replica.
+
+    For read-only routes that can tolerate replication lag; without replicas
+    configured this is the same as get_db.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal(info={"read_only": True}) as db:
+            yield db
+        return
+
+    db = SessionLocal(info={"read_only": True})
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def get_session_factory():
+    """Session factory, for streaming responses that outlive the request.
+
+    Dependencies are torn down before a streaming body is sent, so such
+    responses open and close a session of their own.
+    """
+    return AsyncSessionLocal if AsyncSessionLocal is not None else SessionLocal
+
+
+async def run_db(db: AnySession, fn, *args, **kwargs):
+    """Run `fn(session, *args, **kwargs)` without blocking the event loop.
+
+    With an AsyncSession the sync function runs through run_sync on the async
+    driver; with a sync Session it runs on the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def release_db(db: AnySession) -> None:
+    """Give the session's connection back to the pool; the session stays usable.
+
+    For long-lived responses that only needed the database up front.
+    """
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
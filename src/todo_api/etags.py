@@ -0,0 +1,69 @@
+import hashlib
+from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the values a representation depends on."""
+    digest = hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches the current ETag.
+
+    If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def version_etag(version: int) -> str:
+    """ETag of a single task: its version, as read back by parse_if_match."""
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str | None) -> int | None:
+    """Read the expected task version from an If-Match header.
+
+    Writes are conditioned on the task's `version`, so `If-Match: "3"`, the
+    ETag of a task at version 3, only lets the write through while the task
+    is still at that version.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=412, detail="Task version does not match")
+    return int(tag)
+
+
+class CompressedETagMiddleware:
+    """Weakens the ETag of responses sent with a Content-Encoding.
+
+    A strong ETag stands for the exact bytes, which differ between the gzip
+    and identity bodies of a resource. The weak form still validates both,
+    If-None-Match using the weak comparison. Must wrap the compression.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = headers.get("etag")
+                if etag and "content-encoding" in headers and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
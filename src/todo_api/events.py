@@ -0,0 +1,151 @@
+"""Per-user fan-out of task events to connected streams.
+
+Handlers publish to the hub after their transaction commits. The hub hands
+events to a backend, which delivers them back to the hub of every worker
+sharing it; each hub then pushes them onto the bounded queues of that user's
+local subscribers. A subscriber that falls behind is dropped rather than
+letting its queue grow, and can catch up through /tasks/changes.
+"""
+
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable
+
+Deliver = Callable[[int, dict], None]
+
+
+class LocalBackend:
+    """Delivers events within this process only."""
+
+    def __init__(self):
+        self._deliver: Deliver = lambda user_id, event: None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        self._deliver(user_id, event)
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Shares events between workers through a Redis pub/sub channel.
+
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str, channel: str = "todo-api:task-events"):
+        self.url = url
+        self.channel = channel
+        self._reader: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._reader = asyncio.create_task(self._read(deliver))
+
+    async def _read(self, deliver: Deliver) -> None:
+        async for message in self._pubsub.listen():
+            payload = json.loads(message["data"])
+            deliver(payload["user_id"], payload["event"])
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        payload = json.dumps({"user_id": user_id, "event": event})
+        await self._redis.publish(self.channel, payload)
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow: discard the backlog and tell the stream to end
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    def close(self) -> None:
+        """End the stream once the queued events are sent."""
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.push(None)
+
+
+class EventHub:
+    def __init__(self, backend=None, queue_size: int = 100):
+        self.backend = backend or LocalBackend()
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[Subscriber]] = {}
+
+    async def start(self) -> None:
+        await self.backend.start(self.deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        await self.backend.publish(user_id, event)
+
+    def deliver(self, user_id: int, event: dict) -> None:
+        for subscriber in list(self._subscribers.get(user_id, ())):
+            if not subscriber.dropped:
+                subscriber.push(event)
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def close_streams(self) -> None:
+        """End every local stream, e.g. so that clients reconnect to another
+        worker while this one shuts down."""
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                subscriber.close()
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def format_sse(event: dict) -> str:
+    """Serialize an event as a server-sent event."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def _create_backend():
+    # A user's streams may be connected to any worker
+    url = os.getenv("EVENTS_REDIS_URL") or os.getenv("SHARED_STATE_URL")
+    return RedisBackend(url) if url else LocalBackend()
+
+
+hub = EventHub(
+    backend=_create_backend(),
+    queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+)
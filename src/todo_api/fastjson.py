@@ -0,0 +1,49 @@
+"""Serialize task rows straight to JSON, without building a model per row.
+
+Large task lists spend most of their time hydrating ORM objects and then
+validating each one through TaskResponse. The fast path selects only the
+response columns as plain tuples and encodes them directly, with orjson when
+it is installed (`pip install todo-api[fast]`) and the stdlib otherwise. It
+must produce the same document as TaskResponse.
+
+Enabled with TASKS_FAST_JSON=1.
+"""
+
+import json
+import os
+from datetime import datetime
+from enum import Enum
+from typing import Sequence
+from .models import Task
+from .schemas import TaskResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+enabled = os.getenv("TASKS_FAST_JSON", "").strip().lower() in ("1", "true", "yes")
+
+# The columns of a TaskResponse, in field order
+TASK_FIELDS = tuple(TaskResponse.model_fields)
+TASK_COLUMNS = tuple(getattr(Task, name) for name in TASK_FIELDS)
+
+
+def _default(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    """Encode enums as their value and datetimes as ISO 8601 strings."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def dump_task_rows(rows: Sequence[tuple]) -> bytes:
+    """Encode rows selected with TASK_COLUMNS as a list of TaskResponse objects."""
+    return dumps([dict(zip(TASK_FIELDS, row)) for row in rows])
@@ -0,0 +1,166 @@
+"""Argon2 password hashing on a dedicated, bounded process pool.
+
+Hashing is deliberately slow, so running it on the request threads lets a
+burst of logins starve every other endpoint. Here it runs on its own pool of
+processes sized to the cores, and callers beyond the pool plus a bounded
+queue are turned away with 503 instead of piling up.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from functools import cache
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from . import metrics
+
+
+def _argon2_settings() -> dict:
+    """Argon2 cost parameters from the environment, passlib defaults otherwise."""
+    settings = {}
+    for name in ("time_cost", "memory_cost", "parallelism"):
+        value = os.getenv(f"ARGON2_{name.upper()}")
+        if value is not None:
+            settings[f"argon2__{name}"] = int(value)
+    return settings
+
+
+@cache
+def pwd_context():
+    """Configuration for password hashing, built on first use.
+
+    passlib and the argon2 backend take a while to load, and only the
+    hashing workers need them.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["argon2"], deprecated="auto", **_argon2_settings())
+
+
+def hash_password(password: str) -> str:
+    """Hash a password using Argon2."""
+    return pwd_context().hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain password against a hashed password."""
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+class HashingExecutor:
+    """Runs hashing jobs on a process pool with admission control.
+
+    At most `workers` jobs run at once and at most `queue_size` more wait for
+    a free worker; anything beyond that is rejected immediately. With
+    `workers=0` jobs run on the threadpool instead, which is only meant for
+    tests and single-core boxes.
+    """
+
+    def __init__(self, workers: int, queue_size: int, latency_window: int = 1000):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs admitted but still waiting for a worker."""
+        return max(0, self.in_flight - max(self.workers, 1))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Workers only import this module, not the app, so spawn is cheap
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def run(self, fn, *args):
+        if self.in_flight >= max(self.workers, 1) + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            if self.workers > 0:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_pool(), fn, *args)
+            return await run_in_threadpool(fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight -= 1
+            self.completed += 1
+            self._latencies.append(elapsed)
+            metrics.password_hash_duration.observe(
+                elapsed, operation=fn.__name__.removesuffix("_password")
+            )
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """Queue depth and latency (queueing included) of recent jobs."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_seconds": percentile(0.50),
+            "latency_p99_seconds": percentile(0.99),
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_default_workers = os.cpu_count() or 1
+password_hasher = HashingExecutor(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(_default_workers))),
+    queue_size=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", str(_default_workers * 4))),
+)
+
+
+def _executor_gauges():
+    stats = password_hasher.stats()
+    return [
+        ({"stat": key}, stats[key]) for key in ("workers", "in_flight", "queue_depth")
+    ]
+
+
+metrics.registry.collected(
+    "password_hash_executor",
+    "Password hashing executor workers, in-flight jobs and queue depth.",
+    "gauge",
+    _executor_gauges,
+)
+metrics.registry.collected(
+    "password_hash_rejected_total",
+    "Password hashing jobs refused with 503 because the queue was full.",
+    "counter",
+    lambda: [({}, password_hasher.rejected)],
+)
@@ -0,0 +1,148 @@
+"""Streaming import of tasks from NDJSON or CSV.
+
+The request body is split into records as it arrives and each record is
+validated against TaskCreate. Valid tasks are inserted IMPORT_CHUNK_SIZE at
+a time, one transaction per chunk, so memory stays bounded by the chunk size
+and the longest line rather than by the size of the upload. CSV needs a
+header row; columns other than those of TaskCreate are ignored and empty
+schedule fields read as null, so an export can be imported back as is.
+"""
+
+import codecs
+import csv
+import os
+from typing import AsyncIterator, Awaitable, Callable
+from pydantic import ValidationError
+from .schemas import (
+    SCHEDULE_FIELDS,
+    TaskCreate,
+    TaskImportError,
+    TaskImportResponse,
+)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("TASKS_IMPORT_CHUNK_SIZE", "1000"))
+
+# Longer records are rejected without being buffered whole
+MAX_RECORD_BYTES = 64 * 1024
+
+# Only the first rejections are reported in detail
+MAX_REPORTED_ERRORS = 100
+
+MEDIA_TYPES = {"application/x-ndjson": "ndjson", "text/csv": "csv"}
+
+
+class RecordTooLong(Exception):
+    pass
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], quoted: bool = False
+) -> AsyncIterator[tuple[int, bytes | RecordTooLong]]:
+    """Yield (line number, record) for each non-blank record of the body.
+
+    With `quoted`, a record continues over newlines inside double quotes, as
+    CSV fields may: the newline only ends the record once its quotes pair up.
+    A UTF-8 byte order mark at the start of the body, which spreadsheets
+    write, is dropped.
+    """
+    buffer = b""
+    scan_from = 0
+    line_no = 0
+    start_line = 1
+    # Discarding the rest of an overlong record
+    skipping = False
+    at_start = True
+    async for chunk in chunks:
+        buffer += chunk
+        if at_start:
+            if codecs.BOM_UTF8.startswith(buffer):
+                # Not enough of the body yet to tell
+                continue
+            buffer = buffer.removeprefix(codecs.BOM_UTF8)
+            at_start = False
+        while (end := buffer.find(b"\n", scan_from)) >= 0:
+            line_no += 1
+            if quoted and buffer.count(b'"', 0, end) % 2:
+                scan_from = end + 1
+                continue
+            record, buffer, scan_from = buffer[:end], buffer[end + 1 :], 0
+            if len(record) > MAX_RECORD_BYTES and not skipping:
+                yield start_line, RecordTooLong()
+            elif not skipping and record.strip():
+                yield start_line, record.rstrip(b"\r")
+            skipping = False
+            start_line = line_no + 1
+        if len(buffer) > MAX_RECORD_BYTES and not skipping:
+            skipping = True
+            yield start_line, RecordTooLong()
+        if skipping:
+            # Drop the data but keep its quote parity
+            buffer = b'"' * (buffer.count(b'"') % 2 if quoted else 0)
+            scan_from = len(buffer)
+    if buffer.strip() and not skipping:
+        yield start_line, buffer.rstrip(b"\r")
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        error = exc.errors()[0]
+        location = ".".join(map(str, error["loc"]))
+        return f"{location}: {error['msg']}" if location else error["msg"]
+    if isinstance(exc, RecordTooLong):
+        return f"Record longer than {MAX_RECORD_BYTES} bytes"
+    if isinstance(exc, UnicodeDecodeError):
+        return "Invalid UTF-8"
+    return str(exc) or type(exc).__name__
+
+
+async def import_tasks(
+    chunks: AsyncIterator[bytes],
+    import_format: str,
+    insert_chunk: Callable[[list[TaskCreate]], Awaitable[int]],
+    chunk_size: int | None = None,
+) -> TaskImportResponse:
+    """Validate the records of a body and hand valid tasks over in chunks."""
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    summary = TaskImportResponse()
+    pending: list[TaskCreate] = []
+    header: list[str] | None = None
+
+    def reject(line: int, exc: Exception) -> None:
+        summary.rejected += 1
+        if len(summary.errors) < MAX_REPORTED_ERRORS:
+            summary.errors.append(TaskImportError(line=line, error=_error_message(exc)))
+
+    async for line, record in iter_records(chunks, quoted=import_format == "csv"):
+        try:
+            if isinstance(record, RecordTooLong):
+                raise record
+            if import_format == "csv":
+                values = next(csv.reader([record.decode()]))
+                if header is None:
+                    header = values
+                    continue
+                if len(values) != len(header):
+                    raise ValueError(
+                        f"Expected {len(header)} fields, got {len(values)}"
+                    )
+                task = TaskCreate.model_validate(
+                    {
+                        name: value
+                        for name, value in zip(header, values)
+                        if value or name not in SCHEDULE_FIELDS
+                    }
+                )
+            else:
+                task = TaskCreate.model_validate_json(record)
+            pending.append(task)
+        except (ValueError, csv.Error, RecordTooLong) as exc:
+            # ValidationError and UnicodeDecodeError included
+            reject(line, exc)
+            continue
+        if len(pending) >= chunk_size:
+            summary.accepted += await insert_chunk(pending)
+            pending = []
+
+    if pending:
+        summary.accepted += await insert_chunk(pending)
+    return summary
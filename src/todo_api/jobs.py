@@ -0,0 +1,77 @@
+"""Maintenance jobs, run out of band from the API workers.
+
+Usage: python -m src.todo_api.jobs migrate
+       python -m src.todo_api.jobs purge-tombstones --days 30
+       python -m src.todo_api.jobs reconcile-stats [--user-id ID]
+       python -m src.todo_api.jobs purge-revoked-tokens
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from . import crud
+from .database import SessionLocal, create_tables
+
+
+def migrate() -> None:
+    """Create the missing tables, indexes and triggers.
+
+    Run before starting the API on a new database; the API itself never
+    issues DDL.
+    """
+    create_tables()
+
+
+def purge_tombstones(days: int) -> int:
+    """Purge tombstones of tasks deleted more than `days` days ago."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    with SessionLocal() as db:
+        return crud.purge_tombstones(db, cutoff)
+
+
+def reconcile_stats(user_id: int | None = None) -> int:
+    """Rebuild the task status counters from the tasks table."""
+    with SessionLocal() as db:
+        return crud.reconcile_task_counters(db, user_id)
+
+
+def purge_revoked_tokens() -> int:
+    """Delete revocations of tokens that have expired."""
+    with SessionLocal() as db:
+        return crud.purge_revoked_tokens(db)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Todo API maintenance jobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="Create missing tables and triggers")
+    purge = commands.add_parser(
+        "purge-tombstones", help="Purge tombstones of deleted tasks"
+    )
+    purge.add_argument(
+        "--days", type=int, default=30, help="Retention for tombstones, in days"
+    )
+    reconcile = commands.add_parser(
+        "reconcile-stats", help="Rebuild task counters from the tasks table"
+    )
+    reconcile.add_argument(
+        "--user-id", type=int, default=None, help="Only this user, default all"
+    )
+    commands.add_parser(
+        "purge-revoked-tokens", help="Delete revocations of expired tokens"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        migrate()
+        print("Created missing tables and triggers")
+    elif args.command == "purge-tombstones":
+        print(f"Purged {purge_tombstones(args.days)} tombstones")
+    elif args.command == "reconcile-stats":
+        print(f"Rebuilt {reconcile_stats(args.user_id)} task counters")
+    elif args.command == "purge-revoked-tokens":
+        print(f"Purged {purge_revoked_tokens()} revoked tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,536 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
-from .schemas import TaskCreate, TaskUpdate, TaskResponse
-from .models import Task
-from .database import get_db, create_tables
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from fastapi import (
+    APIRouter,
+    FastAPI,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, StreamingResponse
+from . import (
+    assets,
+    crud,
+    database,
+    fastjson,
+    importer,
+    metrics,
+    profiling,
+    ratelimit,
+    scheduler,
+)
+from .config import Settings
+from .export import MEDIA_TYPES, ExportFormat, export_tasks
+from .schemas import (
+    TaskBatch,
+    TaskBatchResponse,
+    TaskChange,
+    TaskChangesResponse,
+    TaskCreate,
+    TaskImportResponse,
+    TaskUpdate,
+    TaskResponse,
+    TaskSearchResult,
+    TaskStats,
+)
+from .models import TaskStatus
+from .pagination import decode_cursor, decode_change_cursor, encode_change_cursor
+from .etags import (
+    CompressedETagMiddleware,
+    etag_matches,
+    make_etag,
+    parse_if_match,
+    version_etag,
+)
+from .database import (
+    AnySession,
+    dispose_engines,
+    get_db,
+    get_read_db,
+    get_session_factory,
+    release_db,
+    run_db,
+    warm_pools,
+)
 from .auth_routes import auth_router
-from .auth_utils import get_current_user
-from .auth_models import User
+from .auth_utils import Principal, get_current_principal
+from .hashing import password_hasher
+from .events import format_sse, hub
 
-app: FastAPI = FastAPI(title="Todo API", version="0.1.0")
-app.include_router(auth_router)
+logger = logging.getLogger(__name__)
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="src/todo_api/static"), name="static")
-templates: Jinja2Templates = Jinja2Templates(directory="src/todo_api/templates")
+BASE_DIR = Path(__file__).resolve().parent
 
-# Initialize the database and create tables
-create_tables()
+startup_seconds = metrics.registry.gauge(
+    "app_startup_seconds",
+    "CPU time to boot the interpreter and build the app, wall time of the "
+    "startup hooks.",
+)
 
 
-@app.get("/", response_class=HTMLResponse)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    await warm_pools()
+    await hub.start()
+    task_scheduler = scheduler.Scheduler() if scheduler.enabled else None
+    if task_scheduler is not None:
+        task_scheduler.start()
+    elapsed = time.perf_counter() - start
+    startup_seconds.set(elapsed, phase="startup_hooks")
+    logger.info(
+        "Started: boot %.0f ms CPU, startup hooks %.0f ms",
+        app.state.boot_seconds * 1000,
+        elapsed * 1000,
+    )
+    yield
+    if task_scheduler is not None:
+        await task_scheduler.stop()
+    await hub.stop()
+    password_hasher.shutdown()
+    await dispose_engines()
+
+
+def get_index_page(request: Request) -> assets.Asset:
+    """The index page, rendered on first request and served from memory after.
+
+    The page only depends on constants and the static asset fingerprints,
+    which do not change while the process runs.
+    """
+    page = getattr(request.app.state, "index_page", None)
+    if page is None:
+        from jinja2 import Environment, FileSystemLoader
+
+        templates = Environment(
+            loader=FileSystemLoader(BASE_DIR / "templates"), autoescape=True
+        )
+        html = templates.get_template("index.html").render(
+            title="To Do App", static_url=request.app.state.static.url
+        )
+        page = request.app.state.index_page = assets.build_asset(
+            html.encode(), "text/html; charset=utf-8"
+        )
+    return page
+
+
+router = APIRouter()
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+
+@router.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse(
-        "index.html", {"request": request, "title": "To Do App"}
+    return assets.asset_response(
+        get_index_page(request), request.headers, assets.REVALIDATE
     )
 
 
-@app.get("/tasks/", response_model=list[TaskResponse])
-def get_tasks(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+# Browsers must revalidate task reads, which is cheap thanks to the ETags
+TASK_READ_CACHE_CONTROL = "private, no-cache"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics for this worker."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/tasks/", response_model=list[TaskResponse])
+async def get_tasks(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    status: TaskStatus | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    updated_after: datetime | None = None,
+    updated_before: datetime | None = None,
+    if_none_match: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_read_db),
 ):
-    db_tasks = db.query(Task).filter(Task.user_id == current_user.id).all()
+    """List tasks, most recently updated first.
+
+    Pages are keyed on (updated_at, id); when more rows remain, the opaque
+    cursor for the next page is returned in the X-Next-Cursor header.
+
+    The ETag is derived from the user's change stamp, so an unchanged list
+    is answered with 304 without touching the tasks table.
+    """
+    seq = await run_db(db, crud.get_change_seq, current_user.id)
+    etag = make_etag(current_user.id, seq, "list", request.url.query)
+    headers = {"ETag": etag, "Cache-Control": TASK_READ_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    db_tasks, next_cursor = await run_db(
+        db,
+        crud.list_tasks,
+        current_user.id,
+        limit=limit,
+        after=decode_cursor(cursor) if cursor is not None else None,
+        status=status,
+        created_after=created_after,
+        created_before=created_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
+        columns=fastjson.TASK_COLUMNS if fastjson.enabled else None,
+    )
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    if fastjson.enabled:
+        return Response(
+            fastjson.dump_task_rows(db_tasks),
+            media_type="application/json",
+            headers=headers,
+        )
+    response.headers.update(headers)
     return db_tasks
 
 
-@app.get("/tasks/{task_id}", response_model=TaskResponse)
-def get_task(
-    task_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+@router.get("/tasks/changes", response_model=TaskChangesResponse)
+async def get_task_changes(
+    since: str | None = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
+):
+    """Tasks created, updated or deleted since a cursor, in change order.
+
+    Without `since` the feed starts from the beginning, which doubles as a
+    full sync. A cursor older than purged tombstones gets 410 and the client
+    must resync from scratch.
+    """
+    purged_seq = await run_db(db, crud.get_purged_seq, current_user.id)
+    if since is None:
+        after, base_seq = (0, 0), purged_seq
+    else:
+        change_seq, task_id, base_seq = decode_change_cursor(since)
+        after = (change_seq, task_id)
+        # Tombstones this client has not seen yet may have been purged
+        if purged_seq > max(change_seq, base_seq):
+            raise HTTPException(status_code=410, detail="Cursor expired, resync")
+
+    db_tasks, has_more = await run_db(
+        db, crud.list_changes, current_user.id, after=after, limit=limit
+    )
+    changes = [
+        TaskChange(
+            id=task.id,
+            deleted=task.deleted_at is not None,
+            change_seq=task.change_seq,
+            task=None
+            if task.deleted_at is not None
+            else TaskResponse.model_validate(task),
+        )
+        for task in db_tasks
+    ]
+    if db_tasks:
+        after = (db_tasks[-1].change_seq, db_tasks[-1].id)
+    return TaskChangesResponse(
+        changes=changes,
+        cursor=encode_change_cursor(*after, base_seq),
+        has_more=has_more,
+    )
+
+
+@router.get("/tasks/search", response_model=list[TaskSearchResult])
+async def search_tasks(
+    q: str = Query(min_length=1, max_length=200),
+    status: TaskStatus | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_read_db),
+):
+    """Ranked full-text search over task titles and descriptions."""
+    if not q.split():
+        raise HTTPException(status_code=422, detail="Search query is empty")
+    rows = await run_db(
+        db, crud.search_tasks, current_user.id, q, limit=limit, status=status
+    )
+    return [
+        TaskSearchResult(
+            task=TaskResponse.model_validate(task),
+            rank=rank,
+            title_highlight=title_highlight,
+            description_highlight=description_highlight,
+        )
+        for task, rank, title_highlight, description_highlight in rows
+    ]
+
+
+@router.get("/tasks/export")
+async def export_user_tasks(
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    accept_encoding: str = Header(""),
+    current_user: Principal = Depends(get_current_principal),
+    session_factory=Depends(get_session_factory),
+):
+    """Stream all of the caller's tasks as NDJSON or CSV, gzipped on request."""
+    gzip = "gzip" in accept_encoding.lower()
+    headers = {
+        "Content-Disposition": f'attachment; filename="tasks.{export_format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_tasks(session_factory, current_user.id, export_format, gzip=gzip),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+
+# Comment lines sent on idle streams so proxies keep the connection open
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/tasks/stats", response_model=TaskStats)
+async def get_task_stats(
+    request: Request,
+    response: Response,
+    days: int = Query(7, ge=1, le=90),
+    if_none_match: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_read_db),
+):
+    """Task counts per status and daily completions, from maintained counters."""
+    seq = await run_db(db, crud.get_change_seq, current_user.id)
+    # Completion buckets roll over at midnight UTC even without changes
+    today = datetime.now(timezone.utc).date()
+    etag = make_etag(current_user.id, seq, "stats", today, request.url.query)
+    headers = {"ETag": etag, "Cache-Control": TASK_READ_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    stats = await run_db(db, crud.get_task_stats, current_user.id, days)
+    response.headers.update(headers)
+    return stats
+
+
+@router.get("/tasks/stream")
+async def stream_tasks(
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
 ):
-    db_task = (
-        db.query(Task)
-        .filter(Task.id == task_id)
-        .filter(Task.user_id == current_user.id)
-        .first()
+    """Server-sent events for changes to the caller's tasks, from any device."""
+    # The stream can stay open for hours, don't hold a database connection
+    await release_db(db)
+
+    async def events():
+        with hub.subscribe(current_user.id) as subscriber:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # Dropped for falling behind, the client reconnects and
+                    # catches up through /tasks/changes
+                    return
+                yield format_sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+
+@router.get("/tasks/{task_id}", response_model=TaskResponse)
+async def get_task(
+    task_id: int,
+    response: Response,
+    if_none_match: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_read_db),
+):
+    db_task = await run_db(db, crud.get_task, current_user.id, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
+    # The version, so that the ETag can be sent back as If-Match on writes
+    etag = version_etag(db_task.version)
+    headers = {"ETag": etag, "Cache-Control": TASK_READ_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return db_task
 
 
-@app.post("/tasks/", response_model=TaskResponse)
-def create_task(
+@router.post("/tasks/", response_model=TaskResponse)
+async def create_task(
     task: TaskCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
 ):
-    db_task = Task(
-        title=task.title,
-        description=task.description,
-        status=task.status,
-        user_id=current_user.id,
+    db_task = TaskResponse.model_validate(
+        await run_db(db, crud.create_task, current_user.id, task)
+    )
+    response.headers["ETag"] = version_etag(db_task.version)
+    await hub.publish(
+        current_user.id,
+        {"type": "task.created", "task": db_task.model_dump(mode="json")},
     )
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
     return db_task
 
 
-@app.put("/tasks/{task_id}", response_model=TaskResponse)
-def update_task(
+@router.post("/tasks/batch", response_model=TaskBatchResponse)
+async def batch_tasks(
+    batch: TaskBatch,
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
+):
+    """Create, update and delete many tasks in one request and transaction."""
+    try:
+        result = await run_db(db, crud.apply_task_batch, current_user.id, batch)
+    except crud.RecurrenceWithoutDueError as exc:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Recurring tasks need a due_at: {', '.join(map(str, exc.args))}",
+        )
+    event = {
+        "type": "task.batch",
+        "created": [item.id for item in result.create],
+        "updated": [item.id for item in result.update if item.task],
+        "deleted": [item.id for item in result.delete if item.result == "deleted"],
+    }
+    # One event for the whole batch rather than flooding subscriber queues
+    if event["created"] or event["updated"] or event["deleted"]:
+        await hub.publish(current_user.id, event)
+    return result
+
+
+@router.post("/tasks/import", response_model=TaskImportResponse)
+async def import_user_tasks(
+    request: Request,
+    content_type: str = Header(),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
+):
+    """Import tasks from an NDJSON or CSV body, streamed and inserted in chunks.
+
+    Invalid records are skipped and reported; the valid ones are kept.
+    """
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    import_format = importer.MEDIA_TYPES.get(media_type)
+    if import_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Content-Type must be application/x-ndjson or text/csv",
+        )
+
+    async def insert_chunk(tasks):
+        return await run_db(db, crud.import_tasks, current_user.id, tasks)
+
+    summary = await importer.import_tasks(request.stream(), import_format, insert_chunk)
+    if summary.accepted:
+        # Subscribers catch up through /tasks/changes rather than one event per task
+        await hub.publish(
+            current_user.id, {"type": "task.import", "accepted": summary.accepted}
+        )
+    return summary
+
+
+@router.put("/tasks/{task_id}", response_model=TaskResponse)
+async def update_task(
     task_id: int,
     task_update: TaskUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
 ):
-    db_task = (
-        db.query(Task)
-        .filter(Task.id == task_id)
-        .filter(Task.user_id == current_user.id)
-        .first()
-    )
+    try:
+        db_task = await run_db(
+            db,
+            crud.update_task,
+            current_user.id,
+            task_id,
+            task_update,
+            expected_version=parse_if_match(if_match),
+        )
+    except crud.VersionConflictError:
+        raise HTTPException(status_code=412, detail="Task version does not match")
+    except crud.RecurrenceWithoutDueError:
+        raise HTTPException(status_code=422, detail="A recurring task needs a due_at")
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
-
-    if task_update.title is not None:
-        db_task.title = task_update.title
-    if task_update.description is not None:
-        db_task.description = task_update.description
-    if task_update.status is not None:
-        db_task.status = task_update.status
-
-    db.commit()
-    db.refresh(db_task)
+    response.headers["ETag"] = version_etag(db_task.version)
+    await hub.publish(
+        current_user.id,
+        {"type": "task.updated", "task": db_task.model_dump(mode="json")},
+    )
     return db_task
 
 
-@app.delete("/tasks/{task_id}", response_model=dict)
-def delete_task(
+@router.delete("/tasks/{task_id}", response_model=dict)
+async def delete_task(
     task_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    if_match: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal),
+    db: AnySession = Depends(get_db),
 ):
-    db_task = (
-        db.query(Task)
-        .filter(Task.id == task_id)
-        .filter(Task.user_id == current_user.id)
-        .first()
-    )
-    if not db_task:
+    try:
+        deleted = await run_db(
+            db,
+            crud.delete_task,
+            current_user.id,
+            task_id,
+            expected_version=parse_if_match(if_match),
+        )
+    except crud.VersionConflictError:
+        raise HTTPException(status_code=412, detail="Task version does not match")
+    if not deleted:
         raise HTTPException(status_code=404, detail="Task not found")
-
-    db.delete(db_task)
-    db.commit()
+    await hub.publish(current_user.id, {"type": "task.deleted", "id": task_id})
     return {"detail": "Task deleted successfully"}
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    """Build the application.
+
+    Nothing here touches the database: connections are opened by the
+    lifespan hook and the schema is created by `python -m src.todo_api.jobs
+    migrate`. Settings other than the current database settings rebuild the
+    engines.
+    """
+    if settings is not None and settings != database.config:
+        database.configure(settings)
+
+    app = FastAPI(title="Todo API", version="0.1.0", lifespan=lifespan)
+    app.state.settings = database.config
+    # Outermost last: profiling shares the per-request SQL counters of metrics.
+    # Compression passes through responses that set their own Content-Encoding
+    # (exports, static assets) and event streams.
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=6)
+    app.add_middleware(CompressedETagMiddleware)
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.add_middleware(ratelimit.RateLimitMiddleware)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(auth_router)
+    app.include_router(router)
+    app.state.static = assets.StaticAssets(BASE_DIR / "static")
+    app.mount("/static", app.state.static, name="static")
+
+    # Mostly imports, which are CPU bound
+    app.state.boot_seconds = time.process_time()
+    startup_seconds.set(app.state.boot_seconds, phase="boot")
+    return app
+
+
+app: FastAPI = create_app()
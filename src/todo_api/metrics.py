@@ -0,0 +1,307 @@
+"""Prometheus metrics, in the text exposition format.
+
+A small in-house registry rather than a client library: counters, gauges
+and histograms keyed by label values, plus collectors that read values such
+as pool usage at scrape time. Recording is a dict lookup and a few additions
+under a lock, cheap enough to leave on in production.
+
+Requests are timed by MetricsMiddleware per route template. The SQL issued
+while serving a request is counted through a context variable that the
+engine event hooks (see instrument_engine) add to, which also works for
+queries run on the threadpool or through AsyncSession.run_sync.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable
+from sqlalchemy import Engine, event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (last one is +Inf), sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = [
+                (labels, list(counts), total[0])
+                for labels, (counts, total) in self._values.items()
+            ]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket_labels = (*labels, ("le", _format_value(float(bound))))
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Collected(_Metric):
+    """Values read from elsewhere at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type: str,
+        collector: Callable[[], Iterable[tuple[dict, float]]],
+    ):
+        super().__init__(name, documentation)
+        self.type = type
+        self.collector = collector
+
+    def collect(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(tuple(sorted(labels.items())))} "
+            f"{_format_value(value)}"
+            for labels, value in self.collector()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def collected(self, name: str, documentation: str, type: str, collector):
+        return self.register(Collected(name, documentation, type, collector))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            samples = metric.collect()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being served."
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route template."
+)
+http_request_sql_queries = registry.histogram(
+    "http_request_sql_queries",
+    "SQL statements issued per request.",
+    buckets=QUERY_COUNT_BUCKETS,
+)
+http_request_sql_duration = registry.histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request."
+)
+sql_queries = registry.counter("sql_queries_total", "SQL statements executed.")
+sql_query_duration = registry.histogram(
+    "sql_query_duration_seconds", "Latency of single SQL statements."
+)
+password_hash_duration = registry.histogram(
+    "password_hash_duration_seconds",
+    "Argon2 hash and verify time, queueing included.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+# SQL per request
+
+
+@dataclass
+class RequestSQL:
+    queries: int = 0
+    seconds: float = 0.0
+    # (statement, seconds) of each query, only kept while profiling
+    statements: list[tuple[str, float]] | None = None
+
+
+# Set for the duration of a request; copied into threadpool workers with the
+# rest of the context, so they add to the same object
+current_request_sql: contextvars.ContextVar[RequestSQL | None] = contextvars.ContextVar(
+    "current_request_sql", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+    sql_queries.inc()
+    sql_query_duration.observe(elapsed)
+    request_sql = current_request_sql.get()
+    if request_sql is not None:
+        request_sql.queries += 1
+        request_sql.seconds += elapsed
+        if request_sql.statements is not None:
+            request_sql.statements.append((statement, elapsed))
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for failed statements
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_query_start"):
+        conn.info["metrics_query_start"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time the statements run on a sync engine (or async_engine.sync_engine)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# Requests
+
+
+class MetricsMiddleware:
+    """Times HTTP requests per route template, and the SQL they run.
+
+    A plain ASGI middleware, so streaming responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_sql = RequestSQL()
+        token = current_request_sql.set(request_sql)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            current_request_sql.reset(token)
+            route = scope.get("route")
+            labels = {
+                "method": scope["method"],
+                "route": getattr(route, "path", "unmatched"),
+            }
+            http_request_duration.observe(elapsed, status=str(status), **labels)
+            http_request_sql_queries.observe(request_sql.queries, **labels)
+            http_request_sql_duration.observe(request_sql.seconds, **labels)
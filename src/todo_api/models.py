@@ -1,7 +1,19 @@
 from enum import Enum
-from sqlalchemy import String, DateTime, Integer, Enum as SQLAlchemyEnum, ForeignKey
+from sqlalchemy import (
+    DDL,
+    Date,
+    String,
+    DateTime,
+    Integer,
+    Enum as SQLAlchemyEnum,
+    ForeignKey,
+    Index,
+    event,
+    text,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from .pagination import to_naive_utc
 
 
 class TaskStatus(str, Enum):
@@ -17,6 +29,32 @@ class Base(DeclarativeBase):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Keyset pagination on GET /tasks/ walks (user_id, updated_at, id)
+        Index("ix_tasks_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_tasks_user_status_updated", "user_id", "status", "updated_at", "id"),
+        Index("ix_tasks_user_created", "user_id", "created_at"),
+        # Delta sync walks a user's changes in (change_seq, id) order
+        Index("ix_tasks_user_change_seq", "user_id", "change_seq", "id"),
+        Index("ix_tasks_deleted_at", "deleted_at"),
+        # The scheduler's queues, partial so that they only hold pending work.
+        # deleted_at leads so that SQLite picks them over ix_tasks_deleted_at
+        # even before ANALYZE has run.
+        Index(
+            "ix_tasks_pending_reminders",
+            "deleted_at",
+            "remind_at",
+            postgresql_where=text("reminded_at IS NULL AND deleted_at IS NULL"),
+            sqlite_where=text("reminded_at IS NULL AND deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_tasks_recurring_due",
+            "deleted_at",
+            "due_at",
+            postgresql_where=text("recurrence IS NOT NULL AND deleted_at IS NULL"),
+            sqlite_where=text("recurrence IS NOT NULL AND deleted_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -24,16 +62,211 @@ class Task(Base):
     status: Mapped[TaskStatus] = mapped_column(
         SQLAlchemyEnum(TaskStatus), default=TaskStatus.TODO
     )
+    # Bumped by every update, compared against If-Match for optimistic locking
+    version: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=lambda: datetime.now(timezone.utc)
+        DateTime, default=lambda: to_naive_utc(datetime.now(timezone.utc))
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc),
+        default=lambda: to_naive_utc(datetime.now(timezone.utc)),
+        onupdate=lambda: to_naive_utc(datetime.now(timezone.utc)),
     )
 
+    # Scheduling, naive UTC. A reminder is pending until reminded_at is set;
+    # recurrence is the RRULE for the rest of the series (see recurrence.py).
+    # Tables created before these columns existed need them added, with the
+    # two indexes above, before the app runs against them.
+    due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    remind_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    reminded_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    recurrence: Mapped[str | None] = mapped_column(String(200), nullable=True)
+
+    # Owner's ChangeStamp.seq as of the last change to this task
+    change_seq: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Deleted tasks are kept as tombstones until compaction purges them
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
     # Foreign key to the user who owns the task
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     # Relationship to the user
     owner = relationship("User", back_populates="tasks")
+
+
+# Full-text search over title and description. The index lives outside the
+# ORM mapping and is kept in sync by the database itself: a generated
+# tsvector column with a GIN index on Postgres, an external-content FTS5
+# table maintained by triggers on SQLite. Tables created before it existed
+# need the matching DDL applied once (on SQLite, followed by
+# INSERT INTO tasks_fts(tasks_fts) VALUES('rebuild')).
+_search_ddl = {
+    "postgresql": [
+        """ALTER TABLE tasks ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED""",
+        "CREATE INDEX ix_tasks_search_vector ON tasks USING gin (search_vector)",
+    ],
+    "sqlite": [
+        """CREATE VIRTUAL TABLE tasks_fts USING fts5(
+            title, description, content='tasks', content_rowid='id'
+        )""",
+        """CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER tasks_fts_update AFTER UPDATE OF title, description
+        ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO tasks_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END""",
+    ],
+}
+for _dialect, _statements in _search_ddl.items():
+    for _statement in _statements:
+        event.listen(
+            Task.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect)
+        )
+event.listen(
+    Task.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect="sqlite"),
+)
+
+
+class ChangeStamp(Base):
+    """Per-user counter bumped by every task mutation.
+
+    Lets task reads be validated (ETag / If-None-Match) with a primary key
+    lookup instead of loading the tasks themselves.
+    """
+
+    __tablename__ = "change_stamps"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Highest change_seq among purged tombstones; older sync cursors are stale
+    purged_seq: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: to_naive_utc(datetime.now(timezone.utc))
+    )
+
+
+class SchedulerLease(Base):
+    """Which process runs a singleton background job, and until when."""
+
+    __tablename__ = "scheduler_leases"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(100), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class TaskCounter(Base):
+    """Number of live tasks per user and status, for GET /tasks/stats."""
+
+    __tablename__ = "task_counters"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    status: Mapped[TaskStatus] = mapped_column(
+        SQLAlchemyEnum(TaskStatus), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class TaskCompletionBucket(Base):
+    """Tasks moved to Done per user and UTC day."""
+
+    __tablename__ = "task_completions"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+# Counters are maintained by triggers on tasks, in the transaction of the
+# write, so every path (single writes, batches, imports, purges) keeps them
+# right. Tombstones are not counted. A task counts as completed when it is
+# created as Done or its status changes to Done. Existing databases need the
+# DDL applied once, then `python -m src.todo_api.jobs reconcile-stats` to
+# rebuild the counters from the tasks table.
+_counter_ddl = {
+    "postgresql": [
+        """CREATE OR REPLACE FUNCTION task_counters_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.deleted_at IS NULL THEN
+                UPDATE task_counters SET count = count - 1
+                WHERE user_id = OLD.user_id AND status = OLD.status;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.deleted_at IS NULL THEN
+                INSERT INTO task_counters (user_id, status, count)
+                VALUES (NEW.user_id, NEW.status, 1)
+                ON CONFLICT (user_id, status)
+                DO UPDATE SET count = task_counters.count + 1;
+                IF NEW.status = 'DONE' AND (
+                    TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM 'DONE'
+                ) THEN
+                    INSERT INTO task_completions (user_id, day, count)
+                    VALUES (NEW.user_id, (now() AT TIME ZONE 'utc')::date, 1)
+                    ON CONFLICT (user_id, day)
+                    DO UPDATE SET count = task_completions.count + 1;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS task_counters_apply ON tasks",
+        """CREATE TRIGGER task_counters_apply
+        AFTER INSERT OR DELETE OR UPDATE OF status, deleted_at ON tasks
+        FOR EACH ROW EXECUTE FUNCTION task_counters_apply()""",
+    ],
+    "sqlite": [
+        """CREATE TRIGGER IF NOT EXISTS task_counters_insert AFTER INSERT ON tasks
+        WHEN new.deleted_at IS NULL BEGIN
+            INSERT INTO task_counters (user_id, status, count)
+            VALUES (new.user_id, new.status, 1)
+            ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_counters_update AFTER UPDATE OF status, deleted_at
+        ON tasks WHEN old.status IS NOT new.status
+            OR old.deleted_at IS NOT new.deleted_at BEGIN
+            UPDATE task_counters SET count = count - 1
+            WHERE old.deleted_at IS NULL
+            AND user_id = old.user_id AND status = old.status;
+            INSERT INTO task_counters (user_id, status, count)
+            SELECT new.user_id, new.status, 1 WHERE new.deleted_at IS NULL
+            ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_counters_delete AFTER DELETE ON tasks
+        WHEN old.deleted_at IS NULL BEGIN
+            UPDATE task_counters SET count = count - 1
+            WHERE user_id = old.user_id AND status = old.status;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_completions_insert AFTER INSERT ON tasks
+        WHEN new.status = 'DONE' AND new.deleted_at IS NULL BEGIN
+            INSERT INTO task_completions (user_id, day, count)
+            VALUES (new.user_id, date('now'), 1)
+            ON CONFLICT (user_id, day) DO UPDATE SET count = count + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS task_completions_update AFTER UPDATE OF status ON tasks
+        WHEN new.status = 'DONE' AND old.status IS NOT 'DONE'
+            AND new.deleted_at IS NULL BEGIN
+            INSERT INTO task_completions (user_id, day, count)
+            VALUES (new.user_id, date('now'), 1)
+            ON CONFLICT (user_id, day) DO UPDATE SET count = count + 1;
+        END""",
+    ],
+}
+# After every table exists, as the triggers on tasks write to the counters.
+# This runs on every create_all, so the statements must be idempotent.
+for _dialect, _statements in _counter_ddl.items():
+    for _statement in _statements:
+        event.listen(
+            Base.metadata, "after_create", DDL(_statement).execute_if(dialect=_dialect)
+        )
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime, timezone
+from fastapi import HTTPException, status
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor",
+    )
+
+
+def encode_cursor(updated_at: datetime, task_id: int) -> str:
+    """Encode the keyset position of a task into an opaque cursor."""
+    return _encode([updated_at.isoformat(), task_id])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        updated_at, task_id = _decode(cursor)
+        return datetime.fromisoformat(updated_at), int(task_id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+
+def encode_change_cursor(change_seq: int, task_id: int, base_seq: int) -> str:
+    """Encode a position in a user's change feed into an opaque cursor.
+
+    `base_seq` is the purge horizon when the client started from scratch: it
+    never knew about tasks whose tombstones were purged up to there.
+    """
+    return _encode(["changes", change_seq, task_id, base_seq])
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int, int]:
+    """Decode a cursor produced by encode_change_cursor."""
+    try:
+        kind, change_seq, task_id, base_seq = _decode(cursor)
+        if kind != "changes":
+            raise ValueError(kind)
+        return int(change_seq), int(task_id), int(base_seq)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+
+def to_naive_utc(value: datetime | None) -> datetime | None:
+    """Timestamps are stored as naive UTC, normalize filters to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,168 @@
+"""Per-request SQL profiling for development.
+
+DEBUG_PROFILE selects which requests are profiled:
+
+- unset: none, the default
+- "header": requests sending `X-Debug-Profile: 1`
+- "all": every request
+
+A profiled request records every statement it issues, reports the query
+count and time in a Server-Timing header, and logs a warning when the same
+statement shape runs N_PLUS_ONE_THRESHOLD times or more, the signature of a
+lazy load per row. With DEBUG_PROFILE_DIR set, each profiled request is also
+run under pyinstrument (HTML report) when installed, cProfile otherwise.
+"""
+
+import cProfile
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from starlette.datastructures import MutableHeaders
+from .metrics import RequestSQL, current_request_sql
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - depends on the environment
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+mode = os.getenv("DEBUG_PROFILE", "").strip().lower()
+profile_dir = os.getenv("DEBUG_PROFILE_DIR") or None
+
+PROFILE_HEADER = b"x-debug-profile"
+N_PLUS_ONE_THRESHOLD = 5
+
+# Bound parameter styles: qmark, pyformat, numeric (asyncpg), named
+_PARAM = r"(?:\?|%\(\w+\)s|\$\d+|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so that repeats differing only in values match."""
+    shape = _IN_LIST.sub("(?)", statement)
+    shape = _LITERAL.sub("?", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class RepeatedStatement:
+    shape: str
+    count: int
+    seconds: float
+
+
+def repeated_statements(
+    statements: list[tuple[str, float]], threshold: int | None = None
+) -> list[RepeatedStatement]:
+    """Statement shapes run at least `threshold` times, most frequent first."""
+    threshold = threshold or N_PLUS_ONE_THRESHOLD
+    counts, seconds = Counter(), Counter()
+    for statement, elapsed in statements:
+        shape = statement_shape(statement)
+        counts[shape] += 1
+        seconds[shape] += elapsed
+    return [
+        RepeatedStatement(shape, count, seconds[shape])
+        for shape, count in counts.most_common()
+        if count >= threshold
+    ]
+
+
+def _wants_profile(scope) -> bool:
+    if mode == "all":
+        return True
+    if mode == "header":
+        return dict(scope["headers"]).get(PROFILE_HEADER) in (b"1", b"true")
+    return False
+
+
+# Only one profiler can be active per interpreter; concurrent profiled
+# requests still get their SQL recorded but no dump
+_profiler_active = False
+
+
+def _start_profiler():
+    global _profiler_active
+    if profile_dir is None or _profiler_active:
+        return None
+    _profiler_active = True
+    if Profiler is not None:
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, scope) -> None:
+    global _profiler_active
+    directory = Path(profile_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}"
+    name += re.sub(r"[^\w.-]+", "_", scope["path"])
+    try:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(directory / f"{name}.prof")
+        else:
+            profiler.stop()
+            (directory / f"{name}.html").write_text(profiler.output_html())
+    finally:
+        _profiler_active = False
+
+
+class ProfilingMiddleware:
+    """Records the SQL of profiled requests; a pass-through otherwise."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # Share the request's SQL counters with the metrics middleware
+        request_sql = current_request_sql.get()
+        token = None
+        if request_sql is None:
+            request_sql = RequestSQL()
+            token = current_request_sql.set(request_sql)
+        request_sql.statements = []
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f"sql;dur={request_sql.seconds * 1000:.1f};"
+                    f'desc="{request_sql.queries} queries", app;dur={total_ms:.1f}',
+                )
+            await send(message)
+
+        profiler = _start_profiler()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                _stop_profiler(profiler, scope)
+            for repeated in repeated_statements(request_sql.statements):
+                logger.warning(
+                    "Possible N+1 on %s %s: %d x %s",
+                    scope["method"],
+                    scope["path"],
+                    repeated.count,
+                    repeated.shape,
+                )
+            if token is not None:
+                current_request_sql.reset(token)
@@ -0,0 +1,298 @@
+"""Token-bucket rate limiting per route group.
+
+Each route group (login and registration, task writes) has limits per
+client IP, per username in the request body and per authenticated user id.
+Every limit is a bucket holding up to `burst` tokens and refilling at `rate`
+tokens per second; a request takes one token from each bucket that applies
+and is refused with 429 and Retry-After when one of them is empty.
+
+Buckets live in a bounded in-memory LRU by default, which limits each worker
+on its own. With RATE_LIMIT_REDIS_URL (or SHARED_STATE_URL) set they are
+shared by all workers through Redis (requires the optional `redis` package). Limits are set with
+RATE_LIMIT_<GROUP>_PER_<KEY>="<count>/<second|minute|hour>", e.g.
+RATE_LIMIT_AUTH_PER_IP="20/minute", or "off" to disable one.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol
+from .auth_utils import verify_access_token
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+# Request bodies larger than this are not parsed for a username
+MAX_BODY_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Limit:
+    # Tokens added per second
+    rate: float
+    # Bucket size, the number of requests allowed in a burst
+    burst: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit | None":
+        """Parse "<count>/<period>"; the bucket holds one period's worth."""
+        if value.strip().lower() == "off":
+            return None
+        count, _, period = value.partition("/")
+        count = int(count)
+        return cls(rate=count / _PERIODS[period.strip().lower()], burst=count)
+
+
+@dataclass(frozen=True)
+class RouteGroup:
+    name: str
+    methods: frozenset[str]
+    # Path prefixes
+    paths: tuple[str, ...]
+    per_ip: Limit | None = None
+    per_username: Limit | None = None
+    per_user: Limit | None = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and path.startswith(self.paths)
+
+
+class BucketStore(Protocol):
+    async def take(self, key: str, limit: Limit) -> float:
+        """Take a token; return 0 if allowed, else seconds until one is available."""
+        ...
+
+
+class MemoryBucketStore:
+    """Buckets in a bounded LRU: O(1) per request, least recently used evicted.
+
+    An evicted bucket comes back full, so the size should comfortably exceed
+    the number of clients active within a refill period.
+    """
+
+    def __init__(self, maxsize: int = 100_000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        # key -> (tokens, updated_at)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        now = self.clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated_at) * limit.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Same refill logic as MemoryBucketStore, atomic on the Redis server and
+# using its clock so that every worker agrees
+_TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by all workers through Redis.
+
+    Requires the optional `redis` package; pass `client` to use an existing
+    (or fake) asyncio client instead of connecting to `url`.
+    """
+
+    def __init__(
+        self, url: str | None = None, prefix: str = "todo-api:rl:", client=None
+    ):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        wait = await self._take(
+            keys=[self.prefix + key], args=[limit.rate, limit.burst]
+        )
+        return float(wait)
+
+
+def _limit_from_env(group: str, key: str, default: str) -> Limit | None:
+    return Limit.parse(os.getenv(f"RATE_LIMIT_{group}_PER_{key}", default))
+
+
+def default_groups() -> list[RouteGroup]:
+    return [
+        # Every call runs Argon2
+        RouteGroup(
+            name="auth",
+            methods=frozenset({"POST"}),
+            paths=("/auth/login", "/auth/register"),
+            per_ip=_limit_from_env("AUTH", "IP", "30/minute"),
+            per_username=_limit_from_env("AUTH", "USERNAME", "10/minute"),
+        ),
+        RouteGroup(
+            name="writes",
+            methods=frozenset({"POST", "PUT", "PATCH", "DELETE"}),
+            paths=("/tasks",),
+            per_ip=_limit_from_env("WRITES", "IP", "1200/minute"),
+            per_user=_limit_from_env("WRITES", "USER", "600/minute"),
+        ),
+    ]
+
+
+def _create_store():
+    url = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv("SHARED_STATE_URL")
+    if url:
+        return RedisBucketStore(url)
+    return MemoryBucketStore(int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+
+
+enabled = os.getenv("RATE_LIMIT_ENABLED", "1").strip().lower() not in ("0", "false")
+# Take the client address from X-Forwarded-For, only behind a trusted proxy
+trust_forwarded = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "").strip().lower() in (
+    "1",
+    "true",
+)
+store = _create_store()
+groups = default_groups()
+
+
+def _client_ip(scope, headers: dict[bytes, bytes]) -> str:
+    forwarded = headers.get(b"x-forwarded-for")
+    if trust_forwarded and forwarded:
+        return forwarded.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _user_id(headers: dict[bytes, bytes]) -> int | None:
+    scheme, _, token = (
+        headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    )
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = verify_access_token(token)
+    return payload["uid"] if payload else None
+
+
+async def _read_body(receive) -> tuple[bytes, list[dict]]:
+    """Read the body up to MAX_BODY_BYTES, keeping the messages for replay."""
+    messages, size = [], 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        if not message.get("more_body") or size > MAX_BODY_BYTES:
+            break
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+    return body, messages
+
+
+def _username(body: bytes) -> str | None:
+    try:
+        username = json.loads(body).get("username")
+    except (ValueError, AttributeError):
+        return None
+    return username.lower() if isinstance(username, str) else None
+
+
+class RateLimitMiddleware:
+    """Refuses requests over their route group's limits with 429."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        group = None
+        if scope["type"] == "http" and enabled:
+            method, path = scope["method"], scope["path"]
+            group = next((g for g in groups if g.matches(method, path)), None)
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        checks = [(f"ip:{_client_ip(scope, headers)}", group.per_ip)]
+        if group.per_username is not None:
+            body, messages = await _read_body(receive)
+            receive = _replay(messages, receive)
+            username = _username(body) if len(body) <= MAX_BODY_BYTES else None
+            if username is not None:
+                checks.append((f"username:{username}", group.per_username))
+        if group.per_user is not None:
+            user_id = _user_id(headers)
+            if user_id is not None:
+                checks.append((f"user:{user_id}", group.per_user))
+
+        for key, limit in checks:
+            if limit is None:
+                continue
+            wait = await store.take(f"{group.name}:{key}", limit)
+            if wait > 0:
+                await _too_many_requests(send, wait)
+                return
+        await self.app(scope, receive, send)
+
+
+def _replay(messages: list[dict], receive):
+    pending = list(messages)
+
+    async def replay():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return replay
+
+
+async def _too_many_requests(send, wait: float) -> None:
+    body = json.dumps({"detail": "Too many requests, please retry later"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
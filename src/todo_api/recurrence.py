@@ -0,0 +1,146 @@
+"""Recurrence rules for tasks, a subset of iCalendar RRULE.
+
+Supported parts are FREQ (HOURLY, DAILY, WEEKLY, MONTHLY or YEARLY),
+INTERVAL, COUNT and UNTIL, for instance "FREQ=WEEKLY;INTERVAL=2;COUNT=10",
+plus BYMONTHDAY for MONTHLY and YEARLY series. A recurring task only stores
+the rule for the rest of its series: when an occurrence comes due the
+scheduler creates the next one with what is left of the rule (COUNT
+decremented) and clears the rule on the task it came from.
+
+Monthly and yearly occurrences fall on the day of the month of the first
+due date, or BYMONTHDAY, clamped to the end of shorter months. The rest of
+the rule carries that day as BYMONTHDAY, so a series started on January 31
+goes on to February 28 and then March 31.
+"""
+
+import calendar
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+
+FREQUENCIES = ("HOURLY", "DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+_PARTS = {"FREQ", "INTERVAL", "BYMONTHDAY", "COUNT", "UNTIL"}
+_FIXED_STEPS = {
+    "HOURLY": timedelta(hours=1),
+    "DAILY": timedelta(days=1),
+    "WEEKLY": timedelta(weeks=1),
+}
+_UNTIL_FORMATS = ("%Y%m%dT%H%M%SZ", "%Y%m%dT%H%M%S", "%Y%m%d")
+
+
+def _add_months(value: datetime, months: int, day: int) -> datetime:
+    """Same time on `day` `months` later, clamped to the end of shorter months."""
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    day = min(day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+@dataclass(frozen=True)
+class Recurrence:
+    freq: str
+    interval: int = 1
+    # Day of the month of MONTHLY and YEARLY occurrences, else the start's
+    monthday: int | None = None
+    # Occurrences left in the series, including the current one
+    count: int | None = None
+    # Naive UTC, no occurrence after it
+    until: datetime | None = None
+
+    @classmethod
+    def parse(cls, rule: str) -> "Recurrence":
+        """Parse an RRULE string, raising ValueError for unsupported ones."""
+        parts = {}
+        for part in rule.strip().upper().removeprefix("RRULE:").split(";"):
+            name, sep, value = part.partition("=")
+            if not sep or not value:
+                raise ValueError(f"Invalid recurrence part {part!r}")
+            parts[name.strip()] = value.strip()
+
+        unknown = set(parts) - _PARTS
+        if unknown:
+            raise ValueError(
+                f"Unsupported recurrence parts: {', '.join(sorted(unknown))}"
+            )
+        if parts.get("FREQ") not in FREQUENCIES:
+            raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+        if "COUNT" in parts and "UNTIL" in parts:
+            raise ValueError("COUNT and UNTIL cannot be combined")
+
+        try:
+            interval = int(parts.get("INTERVAL", "1"))
+            count = int(parts["COUNT"]) if "COUNT" in parts else None
+        except ValueError:
+            raise ValueError("INTERVAL and COUNT must be integers") from None
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("INTERVAL and COUNT must be positive")
+
+        monthday = None
+        if "BYMONTHDAY" in parts:
+            if parts["FREQ"] not in ("MONTHLY", "YEARLY"):
+                raise ValueError("BYMONTHDAY only applies to MONTHLY and YEARLY")
+            monthday = parts["BYMONTHDAY"]
+            if not monthday.isdigit() or not 1 <= int(monthday) <= 31:
+                raise ValueError("BYMONTHDAY must be a day of the month, 1 to 31")
+            monthday = int(monthday)
+
+        until = None
+        if "UNTIL" in parts:
+            for date_format in _UNTIL_FORMATS:
+                try:
+                    until = datetime.strptime(parts["UNTIL"], date_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError("UNTIL must look like 20250131T090000Z")
+        return cls(parts["FREQ"], interval, monthday, count, until)
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.monthday is not None:
+            parts.append(f"BYMONTHDAY={self.monthday}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%dT%H%M%SZ}")
+        return ";".join(parts)
+
+    def occurrence(self, start: datetime, n: int) -> datetime:
+        """The n-th occurrence after `start`, which is occurrence 0."""
+        steps = n * self.interval
+        if self.freq in _FIXED_STEPS:
+            return start + _FIXED_STEPS[self.freq] * steps
+        months = steps if self.freq == "MONTHLY" else 12 * steps
+        return _add_months(start, months, self.monthday or start.day)
+
+    def next_after(
+        self, start: datetime, after: datetime
+    ) -> tuple[datetime, "Recurrence | None"] | None:
+        """The next occurrence later than `after`, and the rule that follows it.
+
+        Occurrences missed in between are skipped and count against COUNT.
+        None when the series ends first; the returned rule is None when the
+        returned occurrence is the last one.
+        """
+        rest = self
+        if self.freq in _FIXED_STEPS:
+            step = _FIXED_STEPS[self.freq] * self.interval
+            n = max(1, (after - start) // step + 1)
+        else:
+            n = 1
+            # The next start may be clamped, the rest of the series keeps the day
+            rest = replace(self, monthday=self.monthday or start.day)
+        while self.occurrence(start, n) <= after:
+            n += 1
+
+        due = self.occurrence(start, n)
+        if self.until is not None and due > self.until:
+            return None
+        if self.count is None:
+            return due, rest
+        remaining = self.count - n
+        if remaining < 1:
+            return None
+        return due, (replace(rest, count=remaining) if remaining > 1 else None)
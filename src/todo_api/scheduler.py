@@ -0,0 +1,208 @@
+"""In-process scheduler for task reminders and recurrences.
+
+Pending work lives in the tasks table itself, behind partial indexes on
+remind_at and due_at that only hold reminders not yet sent and tasks whose
+next occurrence is still to be created (see models.Task). Every
+SCHEDULER_POLL_SECONDS the scheduler reads what comes due within the next
+SCHEDULER_WINDOW_SECONDS from those indexes into a heap, then fires entries
+as they come due, up to SCHEDULER_BATCH_SIZE per transaction: a reminder is
+marked sent and published as a task.reminder event, a recurring task gets
+its next occurrence created and published as task.created.
+
+Nothing else is kept, so a restart resumes by reading the indexes again,
+and work that came due while no scheduler ran fires on the first pass.
+Only one process runs the scheduler at a time: the holder of the
+"scheduler" lease, renewed every third of SCHEDULER_LEASE_SECONDS. The
+others keep trying and take over once it expires or is released.
+
+Disabled with SCHEDULER_ENABLED=0.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from starlette.concurrency import run_in_threadpool
+from . import crud, database
+from .events import hub
+
+logger = logging.getLogger(__name__)
+
+enabled = os.getenv("SCHEDULER_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+
+WINDOW_SECONDS = float(os.getenv("SCHEDULER_WINDOW_SECONDS", "60"))
+POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "5"))
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+
+LEASE_NAME = "scheduler"
+REMINDER, RECURRENCE = "reminder", "recurrence"
+
+
+def utcnow() -> datetime:
+    """Current time as naive UTC, like the stored timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        session_factory=None,
+        owner: str | None = None,
+        window: float | None = None,
+        poll_interval: float | None = None,
+        lease_ttl: float | None = None,
+        batch_size: int | None = None,
+        clock=utcnow,
+    ):
+        # The sync sessions of the primary by default, resolved on use
+        self.session_factory = session_factory or (lambda: database.SessionLocal())
+        self.owner = (
+            owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.window = timedelta(seconds=window or WINDOW_SECONDS)
+        self.poll_interval = timedelta(seconds=poll_interval or POLL_SECONDS)
+        self.lease_ttl = timedelta(seconds=lease_ttl or LEASE_SECONDS)
+        self.batch_size = batch_size or BATCH_SIZE
+        self.clock = clock
+
+        # (time, kind, task id), with the queued (kind, task id) pairs
+        self._heap: list[tuple[datetime, str, int]] = []
+        self._queued: set[tuple[str, int]] = set()
+        self._leader = False
+        self._next_renew: datetime | None = None
+        self._next_load: datetime | None = None
+        # The last load hit the batch size, more is due than was read
+        self._truncated = False
+        self._runner: asyncio.Task | None = None
+
+    def _call(self, fn, *args):
+        with self.session_factory() as db:
+            return fn(db, *args)
+
+    async def _db(self, fn, *args):
+        return await run_in_threadpool(self._call, fn, *args)
+
+    async def renew_lease(self, now: datetime) -> bool:
+        leader = await self._db(
+            crud.acquire_lease, LEASE_NAME, self.owner, now, self.lease_ttl
+        )
+        if leader != self._leader:
+            logger.info(
+                "Scheduler lease %s by %s", "taken" if leader else "lost", self.owner
+            )
+        if not leader:
+            # Whoever holds it now reads the same work
+            self._heap.clear()
+            self._queued.clear()
+            self._next_load = None
+        self._leader = leader
+        self._next_renew = now + self.lease_ttl / 3
+        return leader
+
+    async def load(self, now: datetime) -> None:
+        """Queue the work that comes due by the end of the window."""
+        reminders, recurring = await self._db(
+            crud.pending_schedule, now + self.window, self.batch_size
+        )
+        self._truncated = self.batch_size in (len(reminders), len(recurring))
+        for kind, entries in ((REMINDER, reminders), (RECURRENCE, recurring)):
+            for at, task_id in entries:
+                if (kind, task_id) not in self._queued:
+                    self._queued.add((kind, task_id))
+                    heapq.heappush(self._heap, (at, kind, task_id))
+        self._next_load = now + self.poll_interval
+
+    async def fire_due(self, now: datetime) -> int:
+        """Fire the queued entries due by `now`, a batch at a time."""
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            batch: dict[str, list[int]] = {REMINDER: [], RECURRENCE: []}
+            for _ in range(self.batch_size):
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, kind, task_id = heapq.heappop(self._heap)
+                self._queued.discard((kind, task_id))
+                batch[kind].append(task_id)
+
+            if batch[REMINDER]:
+                for user_id, task in await self._db(
+                    crud.fire_reminders, batch[REMINDER], now
+                ):
+                    fired += 1
+                    await hub.publish(
+                        user_id,
+                        {"type": "task.reminder", "task": task.model_dump(mode="json")},
+                    )
+            if batch[RECURRENCE]:
+                for user_id, task in await self._db(
+                    crud.spawn_recurrences, batch[RECURRENCE], now
+                ):
+                    fired += 1
+                    await hub.publish(
+                        user_id,
+                        {"type": "task.created", "task": task.model_dump(mode="json")},
+                    )
+        return fired
+
+    async def run_once(self, now: datetime | None = None) -> int:
+        """One pass: renew the lease, read the indexes and fire what is due,
+        each when it is time to. Returns the number of reminders sent and
+        occurrences created."""
+        now = now or self.clock()
+        if self._next_renew is None or now >= self._next_renew:
+            await self.renew_lease(now)
+        if not self._leader:
+            return 0
+        fired = 0
+        while True:
+            if self._next_load is None or now >= self._next_load or self._truncated:
+                await self.load(now)
+            fired += await self.fire_due(now)
+            # Read on while a backlog larger than a batch, typically left by
+            # downtime, drains
+            if not self._truncated or self._heap:
+                return fired
+
+    def seconds_until_next(self, now: datetime) -> float:
+        wakeups = [self._next_renew]
+        if self._leader:
+            wakeups.append(self._next_load)
+            if self._heap:
+                wakeups.append(self._heap[0][0])
+        delay = min(wakeup for wakeup in wakeups if wakeup is not None) - now
+        return max(delay.total_seconds(), 0.0)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Scheduler pass failed")
+                self._next_renew = self._next_load = None
+                await asyncio.sleep(self.poll_interval.total_seconds())
+                continue
+            await asyncio.sleep(self.seconds_until_next(self.clock()))
+
+    def start(self) -> None:
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop, and hand the lease over rather than let it expire."""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        if self._leader:
+            self._leader = False
+            try:
+                await self._db(crud.release_lease, LEASE_NAME, self.owner)
+            except Exception:
+                logger.exception("Could not release the scheduler lease")
@@ -1,26 +1,163 @@
-from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+from datetime import date, datetime
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from .models import TaskStatus
+from .pagination import to_naive_utc
+from .recurrence import Recurrence
 
+# Maximum number of items per list in a batch request
+MAX_BATCH_ITEMS = 1000
 
-class TaskCreate(BaseModel):
-    title: str
-    description: str = ""
+
+class TaskSchedule(BaseModel):
+    due_at: datetime | None = None
+    remind_at: datetime | None = None
+    # RRULE subset, e.g. "FREQ=WEEKLY;COUNT=4"; the series starts at due_at
+    recurrence: str | None = None
+
+    @field_validator("due_at", "remind_at")
+    @classmethod
+    def normalize_time(cls, value: datetime | None) -> datetime | None:
+        return to_naive_utc(value)
+
+    @field_validator("recurrence")
+    @classmethod
+    def normalize_recurrence(cls, value: str | None) -> str | None:
+        return str(Recurrence.parse(value)) if value else None
+
+
+SCHEDULE_FIELDS = frozenset(TaskSchedule.model_fields)
+
+
+class TaskCreate(TaskSchedule):
+    # Lengths of the task columns
+    title: str = Field(max_length=200)
+    description: str = Field("", max_length=1000)
     status: TaskStatus = TaskStatus.TODO
 
+    @model_validator(mode="after")
+    def check_recurrence(self):
+        if self.recurrence and self.due_at is None:
+            raise ValueError("A recurring task needs a due_at")
+        return self
+
+
+class TaskUpdate(TaskSchedule):
+    """Fields left out are unchanged; due_at, remind_at and recurrence are
+    cleared by an explicit null."""
 
-class TaskUpdate(BaseModel):
-    title: str | None = None
-    description: str | None = None
+    title: str | None = Field(None, max_length=200)
+    description: str | None = Field(None, max_length=1000)
     status: TaskStatus | None = None
 
+    @model_validator(mode="after")
+    def check_recurrence(self):
+        # Updates setting only one of the two are checked against the stored
+        # task by crud
+        if self.recurrence and "due_at" in self.model_fields_set and not self.due_at:
+            raise ValueError("A recurring task needs a due_at")
+        return self
+
+    def values(self) -> dict:
+        """The column values to write."""
+        values = self.model_dump(exclude_none=True)
+        values.update(self.model_dump(include=SCHEDULE_FIELDS, exclude_unset=True))
+        if "remind_at" in values:
+            # A new reminder is pending again
+            values["reminded_at"] = None
+        return values
+
 
 class TaskResponse(BaseModel):
     id: int
     title: str
     description: str
     status: TaskStatus
+    version: int
     created_at: datetime
     updated_at: datetime
+    due_at: datetime | None = None
+    remind_at: datetime | None = None
+    recurrence: str | None = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+
+class TaskBatch(BaseModel):
+    create: list[TaskCreate] = Field(default=[], max_length=MAX_BATCH_ITEMS)
+    update: list[TaskBatchUpdate] = Field(default=[], max_length=MAX_BATCH_ITEMS)
+    delete: list[int] = Field(default=[], max_length=MAX_BATCH_ITEMS)
+
+    @model_validator(mode="after")
+    def check_ids(self):
+        update_ids = [item.id for item in self.update]
+        if len(set(update_ids)) != len(update_ids):
+            raise ValueError("A task can only be updated once per batch")
+        if len(set(self.delete)) != len(self.delete):
+            raise ValueError("A task can only be deleted once per batch")
+        if set(update_ids) & set(self.delete):
+            raise ValueError("A task cannot be both updated and deleted")
+        return self
+
+
+class TaskBatchItemResult(BaseModel):
+    id: int
+    result: Literal["created", "updated", "deleted", "not_found"]
+    task: TaskResponse | None = None
+
+
+class TaskBatchResponse(BaseModel):
+    create: list[TaskBatchItemResult]
+    update: list[TaskBatchItemResult]
+    delete: list[TaskBatchItemResult]
+
+
+class TaskChange(BaseModel):
+    id: int
+    deleted: bool
+    change_seq: int
+    task: TaskResponse | None = None
+
+
+class TaskChangesResponse(BaseModel):
+    changes: list[TaskChange]
+    # Pass back as `since` to get the changes that follow
+    cursor: str
+    has_more: bool
+
+
+class TaskSearchResult(BaseModel):
+    task: TaskResponse
+    rank: float
+    # Escaped HTML, matched terms wrapped in <mark></mark>
+    title_highlight: str
+    description_highlight: str
+
+
+class TaskImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TaskImportResponse(BaseModel):
+    accepted: int = 0
+    rejected: int = 0
+    # Only the first rejections are listed
+    errors: list[TaskImportError] = []
+
+
+class TaskCompletionDay(BaseModel):
+    day: date
+    count: int
+
+
+class TaskStats(BaseModel):
+    # Live tasks, tombstones excluded
+    total: int
+    by_status: dict[TaskStatus, int]
+    # Tasks moved to Done per UTC day, oldest first
+    completed: list[TaskCompletionDay]
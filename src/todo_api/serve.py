@@ -0,0 +1,132 @@
+"""Production runner: uvicorn with one worker process per available core.
+
+Usage: python -m src.todo_api.serve [--host HOST] [--port PORT] [--workers N]
+
+The number of workers is --workers, else WEB_CONCURRENCY, else the cores
+this process may run on (CPU affinity, capped by a cgroup CPU quota).
+uvloop and httptools are used when installed (`pip install todo-api[fast]`),
+asyncio and h11 otherwise.
+
+On SIGTERM or SIGINT every worker stops accepting connections, ends its
+event streams so that clients reconnect to a live worker, and gives the
+requests in flight up to DRAIN_SECONDS to complete before shutting down.
+
+Workers only share what goes through the database or shared.state, which
+is Redis when SHARED_STATE_URL is set; rate limits and events then follow
+it too. The runner reads (or creates) SECRET_KEY_FILE itself and hands the
+key to its workers. Without SECRET_KEY, SECRET_KEY_FILE or SHARED_STATE_URL
+it picks a signing key for all its workers, valid until it stops.
+"""
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import secrets
+from pathlib import Path
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger("uvicorn.error")
+
+APP = "src.todo_api.main:app"
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", "30"))
+
+
+def available_cpus(cpu_max: Path = CGROUP_CPU_MAX) -> int:
+    """Cores this process may use: its CPU affinity, capped by a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not on Linux
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = cpu_max.read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+class DrainingServer(uvicorn.Server):
+    """Ends the event streams when shutdown starts: they never complete on
+    their own and would hold the drain until its timeout."""
+
+    async def shutdown(self, sockets=None) -> None:
+        from .events import hub
+
+        hub.close_streams()
+        await super().shutdown(sockets)
+
+
+def _share_secret_key() -> None:
+    """Resolve the signing key once, before the workers start."""
+    if os.getenv("SECRET_KEY") is not None:
+        return
+    if os.getenv("SECRET_KEY_FILE"):
+        # Read, or created, here rather than raced for by every worker
+        from .auth_utils import load_secret_key
+
+        os.environ["SECRET_KEY"] = load_secret_key()
+    elif not os.getenv("SHARED_STATE_URL"):
+        # Workers would otherwise each sign with a key of their own
+        os.environ["SECRET_KEY"] = secrets.token_urlsafe(32)
+        logger.warning("SECRET_KEY is not set, tokens do not survive a restart")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument(
+        "--drain-seconds",
+        type=float,
+        default=DRAIN_SECONDS,
+        help="Time given to requests in flight on shutdown",
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    cpus = available_cpus()
+    workers = args.workers or int(os.getenv("WEB_CONCURRENCY", "0")) or cpus
+    _share_secret_key()
+    # One Argon2 process per core across all the workers
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, cpus // workers)))
+
+    config = uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        timeout_graceful_shutdown=args.drain_seconds,
+        log_level=args.log_level,
+    )
+    logger.info(
+        "Serving with %d worker(s) on %d core(s), %s loop, %s parser",
+        workers,
+        cpus,
+        config.loop,
+        config.http,
+    )
+    server = DrainingServer(config)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""State shared by all the workers of a deployment.
+
+Workers are separate processes, so what they must agree on cannot live in
+module globals. The token signing key goes through `state`: a MemoryState,
+only shared within this process, unless SHARED_STATE_URL points at Redis,
+which every worker then shares. Rate limits and events have stores of
+their own, which default to the same Redis.
+"""
+
+import os
+import secrets
+import threading
+from typing import Protocol
+
+
+class SharedState(Protocol):
+    # Whether other processes see the same state
+    external: bool
+
+    def get(self, key: str) -> str | None: ...
+
+    def add(self, key: str, value: str) -> bool:
+        """Set `key` unless it exists; whether it was set."""
+        ...
+
+
+class MemoryState:
+    external = False
+
+    def __init__(self):
+        self._data: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        return self._data.get(key)
+
+    def add(self, key: str, value: str) -> bool:
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = value
+            return True
+
+
+class RedisState:
+    """State kept in Redis, shared by every worker connected to it.
+
+    Requires the optional `redis` package; pass `client` to use an existing
+    (or fake) client instead of connecting to `url`. Calls block, so use it
+    outside the event loop or for values read once, like the signing key.
+    """
+
+    external = True
+
+    def __init__(self, url: str | None = None, prefix: str = "todo-api:", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> str | None:
+        return self.client.get(self.prefix + key)
+
+    def add(self, key: str, value: str) -> bool:
+        return bool(self.client.set(self.prefix + key, value, nx=True))
+
+
+def _create_state() -> SharedState:
+    url = os.getenv("SHARED_STATE_URL")
+    return RedisState(url) if url else MemoryState()
+
+
+state = _create_state()
+
+
+def secret(name: str) -> str:
+    """A random secret in `state`, generated by whichever worker asks first."""
+    state.add(name, secrets.token_urlsafe(32))
+    return state.get(name)
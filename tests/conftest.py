@@ -1,15 +1,30 @@
+from contextlib import contextmanager
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.todo_api import ratelimit, scheduler
 from src.todo_api.main import app
-from src.todo_api.database import get_db
+from src.todo_api.database import get_db, get_read_db, get_session_factory
+from src.todo_api.auth_utils import revoked_tokens, token_version_cache
+from src.todo_api.hashing import password_hasher
+from src.todo_api.metrics import instrument_engine
 from src.todo_api.models import Base
 
 TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Each TestClient runs its own event loop, so async connections are not pooled
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 
 def override_get_db():
     db = TestingSessionLocal()
@@ -19,13 +34,30 @@ def override_get_db():
         db.close()
 
 
-@pytest.fixture
-def client():
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(params=["sync", "async"])
+def client(request, monkeypatch):
+    # Hash on the threadpool, a process pool per test only adds spawn time
+    monkeypatch.setattr(password_hasher, "workers", 0)
+    # Tests drive the scheduler themselves, against the test database
+    monkeypatch.setattr(scheduler, "enabled", False)
+
     # Create the database tables for testing
     Base.metadata.create_all(bind=engine)
 
-    # Override the get_db dependency to use the test database
-    app.dependency_overrides[get_db] = override_get_db
+    # Override the get_db dependency to use the test database, through
+    # either database stack
+    if request.param == "async":
+        app.dependency_overrides[get_db] = override_get_async_db
+        app.dependency_overrides[get_session_factory] = lambda: AsyncTestingSessionLocal
+    else:
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_db]
 
     # Create a TestClient instance
     with TestClient(app) as test_client:
@@ -34,6 +66,9 @@ def client():
     # Drop the database tables after tests
     Base.metadata.drop_all(bind=engine)
     app.dependency_overrides.clear()
+    token_version_cache.clear()
+    revoked_tokens.clear()
+    ratelimit.store.clear()
 
 
 @pytest.fixture
@@ -69,3 +104,54 @@ def auth_token(client, test_user_data, created_user):
 def auth_headers(auth_token):
     """Headers with authentication token"""
     return {"Authorization": f"Bearer {auth_token}"}
+
+
+@pytest.fixture
+def db_session(client):
+    """A session on the test database, for arranging and inspecting state."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def session_factory(client):
+    """Sync sessions on the test database, for code that opens its own."""
+    return TestingSessionLocal
+
+
+@pytest.fixture
+def sql_statements():
+    """Record the SQL statements issued against the test database."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", record)
+    yield statements
+    for target in (engine, async_engine.sync_engine):
+        event.remove(target, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def max_queries(sql_statements):
+    """Assert an upper bound on the SQL statements run inside a block.
+
+    with max_queries(2):
+        client.get("/tasks/", headers=auth_headers)
+    """
+
+    @contextmanager
+    def check(limit: int):
+        sql_statements.clear()
+        yield
+        assert len(sql_statements) <= limit, (
+            f"{len(sql_statements)} queries, expected at most {limit}:\n"
+            + "\n".join(sql_statements)
+        )
+
+    return check
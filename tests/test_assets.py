@@ -0,0 +1,81 @@
+import gzip
+import re
+from src.todo_api.assets import build_asset, choose_encoding
+
+
+def test_index_page_is_cached_and_revalidated(client):
+    """Test that the index page links fingerprinted assets and supports 304."""
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert re.search(r'href="/static/style\.[0-9a-f]{12}\.css"', response.text)
+    assert re.search(r'src="/static/script\.[0-9a-f]{12}\.js"', response.text)
+
+    response = client.get("/", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_fingerprinted_assets_are_immutable(client):
+    """Test long-lived caching of fingerprinted assets and precompressed bodies."""
+    page = client.get("/").text
+    url = re.search(r"/static/style\.[0-9a-f]{12}\.css", page).group()
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"] == "text/css; charset=utf-8"
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    plain = client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["cache-control"] == "no-cache"
+    assert "content-encoding" not in plain.headers
+    assert plain.content == response.content
+    # Weak on the compressed body, equivalent to but not the same bytes
+    assert response.headers["etag"] == f"W/{plain.headers['etag']}"
+
+    assert client.get("/static/missing.css").status_code == 404
+    assert client.post("/static/style.css").status_code == 405
+
+
+def test_choose_encoding():
+    available = {"identity": b"", "gzip": b"", "br": b""}
+    assert choose_encoding("gzip, deflate, br", available) == "br"
+    assert choose_encoding("gzip, br;q=0", available) == "gzip"
+    assert choose_encoding("*", {"identity": b"", "gzip": b""}) == "gzip"
+    assert choose_encoding("", available) == "identity"
+
+
+def test_build_asset_skips_small_bodies():
+    assert set(build_asset(b"tiny", "text/plain").bodies) == {"identity"}
+    asset = build_asset(b"repetitive " * 100, "text/plain")
+    assert gzip.decompress(asset.bodies["gzip"]) == b"repetitive " * 100
+
+
+def test_large_task_lists_are_gzipped(client, auth_headers):
+    """Test that the gzip middleware compresses large JSON responses only."""
+    response = client.get(
+        "/tasks/", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+
+    batch = {"create": [{"title": f"Task {i}"} for i in range(20)]}
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+    response = client.get(
+        "/tasks/", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 20
+
+    # Each encoding has its own validator, and either revalidates the list
+    plain = client.get(
+        "/tasks/", headers={**auth_headers, "Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in plain.headers
+    assert response.headers["etag"] == f"W/{plain.headers['etag']}"
+    response = client.get(
+        "/tasks/",
+        headers={**auth_headers, "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
@@ -1,3 +1,15 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+import pytest
+from fastapi import HTTPException
+from src.todo_api import auth_utils
+from src.todo_api.auth_models import RevokedToken
+from src.todo_api.auth_utils import revoke_user_tokens, revoked_tokens
+from src.todo_api.bloom import BloomFilter
+from src.todo_api.hashing import HashingExecutor
+
+
 def test_register_user(client, test_user_data):
     """Test user registration."""
     response = client.post("/auth/register", json=test_user_data)
@@ -169,3 +181,214 @@ def test_user_isolation(client):
     # User1 cannot see User2's task
     response = client.get(f"/tasks/{user2_task_id}", headers=user1_headers)
     assert response.status_code == 404  # Task not found (car pas la sienne)
+
+
+def test_tasks_skip_user_lookup_on_cached_token(client, auth_headers, sql_statements):
+    """Test that authenticated task requests reuse the cached token version."""
+    client.get("/tasks/", headers=auth_headers)  # Warm the cache
+    sql_statements.clear()
+
+    response = client.get("/tasks/", headers=auth_headers)
+    assert response.status_code == 200
+    assert sql_statements  # The task listing itself was recorded
+    assert not any("FROM users" in statement for statement in sql_statements)
+
+
+def test_revoke_user_tokens(client, auth_headers, created_user, db_session):
+    """Test that revoking a user's tokens invalidates those already issued."""
+    assert client.get("/tasks/", headers=auth_headers).status_code == 200
+
+    asyncio.run(revoke_user_tokens(db_session, created_user["id"]))
+
+    response = client.get("/tasks/", headers=auth_headers)
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Token has been revoked"}
+
+
+@pytest.fixture
+def tokens(client, test_user_data, created_user):
+    """Access and refresh token of a fresh login."""
+    login_data = {
+        "username": test_user_data["username"],
+        "password": test_user_data["password"],
+    }
+    return client.post("/auth/login", json=login_data).json()
+
+
+def test_refresh_rotates_tokens(client, tokens):
+    """Test that a refresh token is exchanged once for a new pair."""
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+
+    headers = {"Authorization": f"Bearer {refreshed['access_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    # Refresh tokens are not access tokens, and the other way around
+    headers = {"Authorization": f"Bearer {refreshed['refresh_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refreshed["access_token"]}
+    )
+    assert response.status_code == 401
+
+
+def test_refresh_token_reuse_revokes_all_tokens(client, tokens):
+    """Test that presenting a used refresh token logs the user out everywhere."""
+    refresh = {"refresh_token": tokens["refresh_token"]}
+    refreshed = client.post("/auth/refresh", json=refresh).json()
+
+    response = client.post("/auth/refresh", json=refresh)
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Refresh token reused, all sessions revoked"}
+
+    for access_token in (tokens["access_token"], refreshed["access_token"]):
+        headers = {"Authorization": f"Bearer {access_token}"}
+        assert client.get("/auth/me", headers=headers).status_code == 401
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": refreshed["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+def test_logout_revokes_tokens(client, tokens):
+    """Test that logout revokes the access token and the refresh token."""
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.post(
+        "/auth/logout",
+        json={"refresh_token": tokens["refresh_token"]},
+        headers=headers,
+    )
+    assert response.status_code == 204
+
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Token has been revoked"}
+    response = client.post(
+        "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+def test_revocations_from_other_workers(client, tokens, db_session, sql_statements):
+    """Test that revocations recorded elsewhere apply once the filter syncs."""
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    # Tokens missing from the filter are accepted without a revocation lookup
+    sql_statements.clear()
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert not any("revoked_tokens" in statement for statement in sql_statements)
+
+    claims = auth_utils.verify_access_token(tokens["access_token"])
+    db_session.add(
+        RevokedToken(
+            jti=claims["jti"],
+            user_id=claims["uid"],
+            expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc).replace(
+                tzinfo=None
+            ),
+        )
+    )
+    db_session.commit()
+    revoked_tokens.sync_interval = 0
+    try:
+        assert client.get("/auth/me", headers=headers).status_code == 401
+    finally:
+        revoked_tokens.sync_interval = 30
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"in-{i}")
+    assert all(f"in-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"out-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_secret_key_file_is_created_once(tmp_path, monkeypatch):
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.setenv("SECRET_KEY_FILE", str(tmp_path / "secret_key"))
+    key = auth_utils.load_secret_key()
+    assert key == auth_utils.load_secret_key()
+    assert (tmp_path / "secret_key").stat().st_mode & 0o777 == 0o600
+
+    monkeypatch.setenv("SECRET_KEY", "configured-" * 3)
+    assert auth_utils.load_secret_key() == "configured-" * 3
+
+
+def test_secret_key_file_created_concurrently(tmp_path, monkeypatch):
+    """Test that processes racing to create the key file all read one full key."""
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.setenv("SECRET_KEY_FILE", str(tmp_path / "secret_key"))
+    keys = []
+    threads = [
+        threading.Thread(target=lambda: keys.append(auth_utils.load_secret_key()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(keys) == 8
+    assert len(set(keys)) == 1
+    assert [path.name for path in tmp_path.iterdir()] == ["secret_key"]
+
+
+def test_short_secret_keys_are_refused(tmp_path, monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "short")
+    with pytest.raises(RuntimeError):
+        auth_utils.load_secret_key()
+
+    monkeypatch.delenv("SECRET_KEY")
+    (tmp_path / "secret_key").write_text("")
+    monkeypatch.setenv("SECRET_KEY_FILE", str(tmp_path / "secret_key"))
+    with pytest.raises(RuntimeError):
+        auth_utils.load_secret_key()
+
+
+def test_hashing_executor_rejects_when_queue_full():
+    """Test that the hashing executor sheds load beyond its queue."""
+    executor = HashingExecutor(workers=0, queue_size=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.queue_depth == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*busy)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_hashing_executor_process_pool():
+    """Test hashing and verifying on the process pool."""
+    executor = HashingExecutor(workers=1, queue_size=1)
+
+    async def scenario():
+        hashed = await executor.hash("s3cret")
+        return await executor.verify("s3cret", hashed), await executor.verify(
+            "wrong", hashed
+        )
+
+    try:
+        assert asyncio.run(scenario()) == (True, False)
+    finally:
+        executor.shutdown()
+    assert executor.stats()["completed"] == 3
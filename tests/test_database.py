@@ -0,0 +1,191 @@
+import logging
+import subprocess
+import sys
+from dataclasses import replace
+from fastapi.testclient import TestClient
+from sqlalchemy import column, create_engine, inspect, table, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from src.todo_api import database, scheduler
+from src.todo_api.config import Settings
+from src.todo_api.database import (
+    ReplicaSet,
+    RoutingSession,
+    build_engine,
+    create_tables,
+    get_read_db,
+    pool_wait_stats,
+)
+from src.todo_api.main import app, create_app
+from src.todo_api.models import Base
+
+
+def test_settings_from_env():
+    """Test that engine settings are read from the environment."""
+    settings = Settings.from_env(
+        {
+            "DATABASE_URL": "postgresql://db/todo",
+            "DATABASE_ASYNC": "true",
+            "DATABASE_POOL_SIZE": "20",
+            "DATABASE_POOL_PRE_PING": "0",
+            "SQLITE_JOURNAL_MODE": "DELETE",
+        }
+    )
+    assert settings.database_url == "postgresql://db/todo"
+    assert settings.database_async is True
+    assert settings.pool_size == 20
+    assert settings.pool_pre_ping is False
+    assert settings.sqlite_journal_mode == "DELETE"
+    assert settings.max_overflow == Settings.max_overflow
+
+
+def test_create_tables_is_idempotent(tmp_path, monkeypatch):
+    """Test that creating the schema again keeps its tables and triggers."""
+    engine = build_engine(Settings(database_url=f"sqlite:///{tmp_path}/schema.db"))
+    monkeypatch.setattr("src.todo_api.database.engine", engine)
+    create_tables()
+    create_tables()
+
+    with engine.connect() as connection:
+        triggers = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        ).scalars()
+        assert {
+            "task_counters_insert",
+            "task_counters_update",
+            "task_counters_delete",
+            "task_completions_insert",
+            "task_completions_update",
+        } <= set(triggers)
+    engine.dispose()
+
+
+def test_sqlite_engine_applies_pragmas(tmp_path):
+    """Test that SQLite connections are configured through connect events."""
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path}/pragmas.db",
+        sqlite_cache_size=-2048,
+        sqlite_busy_timeout_ms=1234,
+    )
+    engine = build_engine(settings)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # NORMAL
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -2048
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    assert engine.pool.size() == settings.pool_size
+    engine.dispose()
+
+
+def test_pool_checkout_waits_are_recorded(tmp_path, caplog):
+    """Test that slow checkouts are measured and logged."""
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path}/pool.db",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+        pool_wait_warn_ms=0,
+    )
+    engine = build_engine(settings)
+    checkouts = pool_wait_stats.checkouts
+    with caplog.at_level(logging.WARNING, logger="src.todo_api.database"):
+        with engine.connect():
+            pass
+    assert pool_wait_stats.checkouts == checkouts + 1
+    assert "Waited" in caplog.text
+    engine.dispose()
+
+
+def _replica_sessions(tmp_path, replica_url):
+    primary = build_engine(Settings(database_url=f"sqlite:///{tmp_path}/primary.db"))
+    replica = build_engine(Settings(database_url=replica_url))
+    for target, name in ((primary, "primary"), (replica, "replica")):
+        try:
+            with target.begin() as conn:
+                conn.execute(text("CREATE TABLE origin (name TEXT)"))
+                conn.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+        except OperationalError:
+            pass
+    replicas = ReplicaSet([replica], health_interval=60)
+    return sessionmaker(bind=primary, class_=RoutingSession, replicas=replicas)
+
+
+def test_read_only_sessions_use_replica(tmp_path):
+    """Test that reads go to the replica until the session writes."""
+    Sessions = _replica_sessions(tmp_path, f"sqlite:///{tmp_path}/replica.db")
+    origin = text("SELECT name FROM origin")
+
+    with Sessions() as db:
+        assert db.execute(origin).scalar() == "primary"
+
+    with Sessions(info={"read_only": True}) as db:
+        assert db.execute(origin).scalar() == "replica"
+        db.execute(update(table("origin", column("name"))).values(name="written"))
+        db.commit()
+        # Read-after-write stays on the primary
+        assert db.execute(origin).scalar() == "written"
+
+
+def test_unhealthy_replica_falls_back_to_primary(tmp_path):
+    """Test that a replica failing its health check is skipped."""
+    Sessions = _replica_sessions(tmp_path, f"sqlite:///{tmp_path}/missing/replica.db")
+
+    with Sessions(info={"read_only": True}) as db:
+        assert db.execute(text("SELECT name FROM origin")).scalar() == "primary"
+
+
+def test_get_routes_read_from_replica(client, auth_headers, tmp_path):
+    """Test that task reads are served by the read-only dependency."""
+    client.post("/tasks/", json={"title": "On primary"}, headers=auth_headers)
+
+    # An empty replica that has not caught up yet
+    replica = build_engine(Settings(database_url=f"sqlite:///{tmp_path}/lagging.db"))
+    Base.metadata.create_all(bind=replica)
+
+    def lagging_read_db():
+        with Session(replica) as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = lagging_read_db
+    assert client.get("/tasks/", headers=auth_headers).json() == []
+    response = client.post("/tasks/", json={"title": "Write"}, headers=auth_headers)
+    assert response.status_code == 200
+    replica.dispose()
+
+
+def test_import_runs_no_ddl(tmp_path):
+    """Test that importing the app neither connects nor creates tables."""
+    db_file = tmp_path / "import.db"
+    subprocess.run(
+        [sys.executable, "-c", "import src.todo_api.main"],
+        env={"DATABASE_URL": f"sqlite:///{db_file}", "SECRET_KEY": "test" * 8},
+        check=True,
+    )
+    assert not db_file.exists()
+
+
+def test_create_app_warms_pool_without_ddl(tmp_path, monkeypatch):
+    """Test that the factory applies its settings and warms the pool on startup."""
+    # It would hold pool connections of its own
+    monkeypatch.setattr(scheduler, "enabled", False)
+    original = database.config
+    settings = replace(
+        original, database_url=f"sqlite:///{tmp_path}/app.db", pool_size=3
+    )
+    try:
+        factory_app = create_app(settings)
+        assert factory_app.state.settings == settings
+        with TestClient(factory_app) as client:
+            pool = database.engine.pool
+            assert pool.checkedin() == 3
+            assert client.get("/metrics").status_code == 200
+            # Building an app for other settings closes the previous pools
+            create_app(replace(settings, pool_size=2))
+            assert pool.checkedin() == 0
+    finally:
+        database.configure(original)
+
+    engine = create_engine(settings.database_url)
+    assert inspect(engine).get_table_names() == []
+    engine.dispose()
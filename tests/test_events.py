@@ -0,0 +1,129 @@
+import asyncio
+from src.todo_api.events import EventHub, format_sse, hub
+from src.todo_api.main import app
+
+
+def test_hub_delivers_to_user_subscribers():
+    """Test that events only reach the subscribers of the target user."""
+    event_hub = EventHub(queue_size=10)
+
+    async def scenario():
+        await event_hub.start()
+        with event_hub.subscribe(1) as mine, event_hub.subscribe(2) as theirs:
+            await event_hub.publish(1, {"type": "task.deleted", "id": 7})
+            assert mine.queue.get_nowait() == {"type": "task.deleted", "id": 7}
+            assert theirs.queue.empty()
+        assert event_hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_hub_drops_slow_subscriber():
+    """Test that a subscriber whose queue overflows is dropped."""
+    event_hub = EventHub(queue_size=2)
+
+    async def scenario():
+        await event_hub.start()
+        with event_hub.subscribe(1) as subscriber:
+            for i in range(3):
+                await event_hub.publish(1, {"type": "task.deleted", "id": i})
+            assert subscriber.dropped
+            assert subscriber.queue.get_nowait() is None
+            assert subscriber.queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_close_streams_ends_every_stream():
+    """Test that closing streams ends them after their queued events."""
+    event_hub = EventHub(queue_size=1)
+
+    async def scenario():
+        await event_hub.start()
+        with event_hub.subscribe(1) as idle, event_hub.subscribe(2) as busy:
+            await event_hub.publish(2, {"type": "task.deleted", "id": 7})
+            event_hub.close_streams()
+            assert idle.queue.get_nowait() is None
+            # A full queue makes room for the end of the stream
+            assert busy.queue.get_nowait() is None
+            assert busy.queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_stream_pushes_task_events(client, auth_headers):
+    """Test that a task change reaches an open event stream."""
+    created = client.post("/tasks/", json={"title": "Seen"}, headers=auth_headers)
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+    assert created.status_code == 200
+
+    async def scenario():
+        await hub.start()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/tasks/stream",
+            "raw_path": b"/tasks/stream",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"authorization", auth_headers["Authorization"].encode()),
+                (b"host", b"testserver"),
+            ],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        disconnected = asyncio.Event()
+        sent = []
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        stream = asyncio.create_task(app(scope, receive, send))
+        while hub.subscriber_count() == 0:
+            await asyncio.sleep(0.01)
+        event = {"type": "task.deleted", "id": created.json()["id"]}
+        await hub.publish(user_id, event)
+        while not any(
+            format_sse(event).encode() == message.get("body") for message in sent
+        ):
+            await asyncio.sleep(0.01)
+        disconnected.set()
+        await asyncio.wait_for(stream, 5)
+        return sent
+
+    sent = asyncio.run(scenario())
+    assert sent[0]["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in sent[0]["headers"]
+    assert hub.subscriber_count() == 0
+
+
+def test_task_mutations_publish_events(client, auth_headers):
+    """Test that task writes publish to the owner's subscribers."""
+    user_id = client.get("/auth/me", headers=auth_headers).json()["id"]
+
+    with hub.subscribe(user_id) as subscriber:
+        task = client.post("/tasks/", json={"title": "A"}, headers=auth_headers)
+        task_id = task.json()["id"]
+        client.put(f"/tasks/{task_id}", json={"title": "B"}, headers=auth_headers)
+        client.delete(f"/tasks/{task_id}", headers=auth_headers)
+        client.post("/tasks/batch", json={"delete": [task_id]}, headers=auth_headers)
+
+        events = [subscriber.queue.get_nowait() for _ in range(3)]
+        # The batch changed nothing, so it published nothing
+        assert subscriber.queue.empty()
+
+    assert [event["type"] for event in events] == [
+        "task.created",
+        "task.updated",
+        "task.deleted",
+    ]
+    assert events[1]["task"]["title"] == "B"
+    assert events[2]["id"] == task_id
@@ -0,0 +1,58 @@
+import re
+from src.todo_api.metrics import Registry
+
+
+def _sample(text: str, name: str, **labels) -> float | None:
+    """Value of a sample in Prometheus text output, matched on a label subset."""
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if not match or match[1] != name:
+            continue
+        sample_labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match[2] or ""))
+        if all(sample_labels.get(key) == value for key, value in labels.items()):
+            return float(match[3])
+    return None
+
+
+def test_histogram_exposition():
+    """Test the text format of a labeled histogram."""
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(0.1, route="/a")
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="0.1") == 2
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="1.0") == 3
+    assert _sample(text, "latency_seconds_bucket", route="/a", le="+Inf") == 3
+    assert _sample(text, "latency_seconds_count", route="/a") == 3
+    assert _sample(text, "latency_seconds_sum", route="/a") == 0.65
+
+
+def test_metrics_endpoint(client, auth_headers):
+    """Test that requests and their SQL are recorded per route template."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers).json()
+    client.get(f"/tasks/{task['id']}", headers=auth_headers)
+    before = client.get("/metrics").text
+    labels = {"method": "GET", "route": "/tasks/{task_id}"}
+    count = _sample(before, "http_request_sql_queries_count", **labels)
+
+    client.get(f"/tasks/{task['id']}", headers=auth_headers)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assert _sample(text, "http_request_sql_queries_count", **labels) == count + 1
+    assert (
+        _sample(text, "http_request_duration_seconds_count", status="200", **labels)
+        >= 2
+    )
+    # Task id paths share one series
+    assert f'route="/tasks/{task["id"]}"' not in text
+    assert _sample(text, "sql_queries_total") > 0
+    assert _sample(text, "http_requests_in_flight") == 1
+    assert _sample(text, "password_hash_duration_seconds_count", operation="hash") >= 1
+    assert _sample(text, "password_hash_executor", stat="workers") == 0
@@ -0,0 +1,62 @@
+import logging
+import pytest
+from src.todo_api import profiling
+
+
+def test_repeated_statements_flag_n_plus_one():
+    """Test that statements differing only in values are grouped."""
+    statements = [
+        (f"SELECT users.id FROM users WHERE users.id = {i}", 0.001) for i in range(6)
+    ]
+    statements += [
+        ("SELECT tasks.id FROM tasks WHERE tasks.id IN (?, ?, ?)", 0.002),
+        ("SELECT tasks.id FROM tasks WHERE tasks.id IN (?)", 0.002),
+    ]
+
+    repeated = profiling.repeated_statements(statements)
+    assert [(r.shape, r.count) for r in repeated] == [
+        ("SELECT users.id FROM users WHERE users.id = ?", 6)
+    ]
+    assert repeated[0].seconds == pytest.approx(0.006)
+
+
+def test_profiled_request(client, auth_headers, monkeypatch, tmp_path, caplog):
+    """Test Server-Timing, N+1 warnings and profile dumps on opted-in requests."""
+    monkeypatch.setattr(profiling, "mode", "header")
+    monkeypatch.setattr(profiling, "profile_dir", str(tmp_path))
+    # Flag every statement, the list endpoint runs each shape once
+    monkeypatch.setattr(profiling, "N_PLUS_ONE_THRESHOLD", 1)
+
+    response = client.get("/tasks/", headers=auth_headers)
+    assert "Server-Timing" not in response.headers
+
+    with caplog.at_level(logging.WARNING, logger="src.todo_api.profiling"):
+        response = client.get(
+            "/tasks/", headers={**auth_headers, "X-Debug-Profile": "1"}
+        )
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("sql;dur=")
+    assert 'desc="2 queries"' in timing
+    assert "Possible N+1 on GET /tasks/" in caplog.text
+    assert [path.suffix for path in tmp_path.iterdir()] == [".prof"]
+
+
+def test_query_budgets(client, auth_headers, max_queries):
+    """Test how many statements the main endpoints issue."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers).json()
+
+    with max_queries(2):
+        client.get("/tasks/", headers=auth_headers)
+    with max_queries(2):
+        client.get(f"/tasks/{task['id']}", headers=auth_headers)
+    with max_queries(3):
+        client.post("/tasks/", json={"title": "Another"}, headers=auth_headers)
+    with max_queries(2):
+        client.put(
+            f"/tasks/{task['id']}", json={"status": "Done"}, headers=auth_headers
+        )
+    with max_queries(3):
+        client.get("/tasks/stats", headers=auth_headers)
+    with max_queries(1):
+        client.get("/auth/me", headers=auth_headers)
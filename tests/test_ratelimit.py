@@ -0,0 +1,179 @@
+import asyncio
+import pytest
+from src.todo_api import ratelimit
+from src.todo_api.ratelimit import (
+    Limit,
+    MemoryBucketStore,
+    RedisBucketStore,
+    RouteGroup,
+)
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Tight limits: 2 logins per username, 3 per IP, 2 task writes per user."""
+
+    def set_groups(**limits):
+        monkeypatch.setattr(
+            ratelimit,
+            "groups",
+            [
+                RouteGroup(
+                    name="auth",
+                    methods=frozenset({"POST"}),
+                    paths=("/auth/login",),
+                    per_ip=limits.get("ip"),
+                    per_username=limits.get("username"),
+                ),
+                RouteGroup(
+                    name="writes",
+                    methods=frozenset({"POST", "PUT", "PATCH", "DELETE"}),
+                    paths=("/tasks",),
+                    per_user=limits.get("user"),
+                ),
+            ],
+        )
+
+    set_groups(
+        ip=Limit.parse("3/hour"),
+        username=Limit.parse("2/hour"),
+        user=Limit.parse("2/hour"),
+    )
+    return set_groups
+
+
+def test_limit_parse():
+    assert Limit.parse("30/minute") == Limit(rate=0.5, burst=30)
+    assert Limit.parse("off") is None
+
+
+def test_login_limited_per_username(client, limited, created_user):
+    limited(ip=Limit.parse("10/hour"), username=Limit.parse("2/hour"))
+    login = {"username": "testuser", "password": "wrong"}
+    for _ in range(2):
+        assert client.post("/auth/login", json=login).status_code == 401
+
+    response = client.post("/auth/login", json=login)
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests, please retry later"}
+    # One token per 1800 seconds
+    assert 1790 < int(response.headers["Retry-After"]) <= 1800
+
+    # Usernames are matched case-insensitively, other users are unaffected
+    login["username"] = "TestUser"
+    assert client.post("/auth/login", json=login).status_code == 429
+    login["username"] = "someoneelse"
+    assert client.post("/auth/login", json=login).status_code == 404
+
+
+def test_login_limited_per_ip(client, limited, created_user):
+    for i in range(3):
+        login = {"username": f"user{i}", "password": "wrong"}
+        assert client.post("/auth/login", json=login).status_code == 404
+
+    login = {"username": "user3", "password": "wrong"}
+    assert client.post("/auth/login", json=login).status_code == 429
+
+
+def test_task_writes_limited_per_user(client, limited, auth_headers):
+    task = {"title": "Task", "description": "Description"}
+    for _ in range(2):
+        assert (
+            client.post("/tasks/", json=task, headers=auth_headers).status_code == 200
+        )
+
+    response = client.post("/tasks/", json=task, headers=auth_headers)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    # Reads are not limited
+    assert client.get("/tasks/", headers=auth_headers).status_code == 200
+
+
+def test_disabled(client, limited, monkeypatch, created_user):
+    monkeypatch.setattr(ratelimit, "enabled", False)
+    login = {"username": "testuser", "password": "wrong"}
+    for _ in range(4):
+        assert client.post("/auth/login", json=login).status_code == 401
+
+
+def test_memory_store_refills_and_evicts():
+    now = 1000.0
+    store = MemoryBucketStore(maxsize=2, clock=lambda: now)
+    limit = Limit(rate=1, burst=2)
+
+    async def take(key):
+        return await store.take(key, limit)
+
+    assert asyncio.run(take("a")) == 0
+    assert asyncio.run(take("a")) == 0
+    assert asyncio.run(take("a")) == pytest.approx(1)
+    now += 0.5
+    assert asyncio.run(take("a")) == pytest.approx(0.5)
+    now += 0.5
+    assert asyncio.run(take("a")) == 0
+
+    # "a" is least recently used once "b" and "c" are added
+    asyncio.run(take("b"))
+    asyncio.run(take("c"))
+    assert len(store) == 2
+    # A new bucket starts full
+    assert asyncio.run(take("a")) == 0
+
+
+class FakeRedis:
+    """Runs the bucket script of RedisBucketStore in memory, on its own clock."""
+
+    def __init__(self):
+        self.time = 1000.0
+        self.hashes: dict[str, dict[str, float]] = {}
+        self.scripts: list[str] = []
+
+    def register_script(self, script):
+        self.scripts.append(script)
+
+        async def run(keys, args):
+            # Same steps as _TAKE_SCRIPT
+            rate, burst = float(args[0]), float(args[1])
+            bucket = self.hashes.get(keys[0], {})
+            tokens = bucket.get("tokens", burst)
+            updated_at = bucket.get("updated_at", self.time)
+            tokens = min(burst, tokens + (self.time - updated_at) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.hashes[keys[0]] = {"tokens": tokens, "updated_at": self.time}
+            return str(wait).encode()
+
+        return run
+
+
+@pytest.fixture
+def redis(client, monkeypatch):
+    memory = ratelimit.store
+    yield FakeRedis()
+    # Back before the client clears the store on teardown
+    monkeypatch.setattr(ratelimit, "store", memory)
+
+
+def test_workers_sharing_a_redis_store(
+    client, limited, monkeypatch, redis, created_user
+):
+    """Test that workers with their own RedisBucketStore share the buckets."""
+    monkeypatch.setattr(ratelimit, "store", RedisBucketStore(client=redis))
+    login = {"username": "testuser", "password": "wrong"}
+    for _ in range(2):
+        assert client.post("/auth/login", json=login).status_code == 401
+    assert redis.scripts == [ratelimit._TAKE_SCRIPT]
+    assert "todo-api:rl:auth:username:testuser" in redis.hashes
+
+    # Another worker, with its own connection to the same Redis
+    monkeypatch.setattr(ratelimit, "store", RedisBucketStore(client=redis))
+    response = client.post("/auth/login", json=login)
+    assert response.status_code == 429
+    assert 1790 < int(response.headers["Retry-After"]) <= 1800
+
+    # Buckets refill on the server's clock
+    redis.time += 1800
+    assert client.post("/auth/login", json=login).status_code == 401
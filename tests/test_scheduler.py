@@ -0,0 +1,213 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from src.todo_api.events import hub
+from src.todo_api.recurrence import Recurrence
+from src.todo_api.scheduler import Scheduler
+
+DUE = datetime(2030, 1, 1, 9, 0)
+
+
+def run(scheduler: Scheduler, now: datetime) -> int:
+    return asyncio.run(scheduler.run_once(now))
+
+
+def test_recurrence_rules():
+    rule = Recurrence.parse("rrule:freq=monthly;count=3")
+    assert str(rule) == "FREQ=MONTHLY;COUNT=3"
+
+    # Month ends are clamped, missed occurrences count against COUNT
+    start = datetime(2030, 1, 31)
+    rest = Recurrence("MONTHLY", monthday=31, count=2)
+    assert rule.next_after(start, start) == (datetime(2030, 2, 28), rest)
+    assert rule.next_after(start, datetime(2030, 3, 1)) == (datetime(2030, 3, 31), None)
+    assert rule.next_after(start, datetime(2030, 4, 1)) is None
+
+    # The next instance keeps the day of the month it was anchored to
+    assert str(rest) == "FREQ=MONTHLY;BYMONTHDAY=31;COUNT=2"
+    assert Recurrence.parse(str(rest)) == rest
+    feb = datetime(2030, 2, 28)
+    assert rest.next_after(feb, feb) == (datetime(2030, 3, 31), None)
+
+    daily = Recurrence.parse("FREQ=DAILY;INTERVAL=2;UNTIL=20300105")
+    assert daily.next_after(DUE, DUE + timedelta(days=1)) == (DUE.replace(day=3), daily)
+    assert daily.next_after(DUE, DUE + timedelta(days=3)) is None
+
+    for invalid in (
+        "FREQ=SECONDLY",
+        "FREQ=DAILY;BYDAY=MO",
+        "FREQ=DAILY;COUNT=0",
+        "FREQ=DAILY;BYMONTHDAY=1",
+        "FREQ=MONTHLY;BYMONTHDAY=32",
+    ):
+        with pytest.raises(ValueError):
+            Recurrence.parse(invalid)
+
+
+def test_task_schedule_fields(client, auth_headers):
+    """Test that schedule fields are normalized, validated and clearable."""
+    response = client.post(
+        "/tasks/",
+        json={
+            "title": "Standup",
+            "due_at": "2030-01-01T10:00:00+01:00",
+            "remind_at": "2030-01-01T08:45:00Z",
+            "recurrence": "freq=daily",
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    task = response.json()
+    assert task["due_at"] == "2030-01-01T09:00:00"
+    assert task["recurrence"] == "FREQ=DAILY"
+
+    response = client.post(
+        "/tasks/",
+        json={"title": "Never", "recurrence": "FREQ=DAILY"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+    response = client.put(
+        f"/tasks/{task['id']}",
+        json={"title": "Daily standup", "recurrence": None},
+        headers=auth_headers,
+    )
+    assert response.json()["recurrence"] is None
+    assert response.json()["remind_at"] == "2030-01-01T08:45:00"
+
+
+def test_updates_keep_recurring_tasks_due(client, auth_headers):
+    """Test that updates cannot leave a recurring task without a due date."""
+    plain = client.post("/tasks/", json={"title": "Plain"}, headers=auth_headers)
+    recurring = client.post(
+        "/tasks/",
+        json={"title": "Daily", "due_at": DUE.isoformat(), "recurrence": "FREQ=DAILY"},
+        headers=auth_headers,
+    )
+    plain_id, recurring_id = plain.json()["id"], recurring.json()["id"]
+
+    for task_id, update in (
+        (plain_id, {"recurrence": "FREQ=DAILY"}),
+        (recurring_id, {"due_at": None}),
+        (recurring_id, {"due_at": None, "recurrence": "FREQ=WEEKLY"}),
+    ):
+        response = client.put(f"/tasks/{task_id}", json=update, headers=auth_headers)
+        assert response.status_code == 422
+        batch = {"update": [{"id": task_id, **update}]}
+        response = client.post("/tasks/batch", json=batch, headers=auth_headers)
+        assert response.status_code == 422
+
+    task = client.get(f"/tasks/{recurring_id}", headers=auth_headers).json()
+    assert task["version"] == 1
+    assert task["recurrence"] == "FREQ=DAILY"
+
+    response = client.put(
+        f"/tasks/{recurring_id}",
+        json={"due_at": None, "recurrence": None},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    batch = {"update": [{"id": plain_id, "due_at": DUE.isoformat()}]}
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+    batch = {"update": [{"id": plain_id, "recurrence": "FREQ=DAILY"}]}
+    response = client.post("/tasks/batch", json=batch, headers=auth_headers)
+    assert response.json()["update"][0]["task"]["recurrence"] == "FREQ=DAILY"
+
+
+def test_scheduler_fires_reminders_and_recurrences(
+    session_factory, client, auth_headers, created_user
+):
+    """Test reminders and recurrence instances, each fired once and published."""
+    client.post(
+        "/tasks/",
+        json={
+            "title": "Water plants",
+            "due_at": DUE.isoformat(),
+            "remind_at": (DUE - timedelta(hours=1)).isoformat(),
+            "recurrence": "FREQ=WEEKLY;COUNT=2",
+        },
+        headers=auth_headers,
+    )
+    scheduler = Scheduler(session_factory, window=60, poll_interval=1)
+
+    with hub.subscribe(created_user["id"]) as subscriber:
+        assert run(scheduler, DUE - timedelta(hours=2)) == 0
+        assert run(scheduler, DUE - timedelta(hours=1)) == 1
+        assert run(scheduler, DUE - timedelta(minutes=30)) == 0
+        event = subscriber.queue.get_nowait()
+        assert event["type"] == "task.reminder"
+        assert event["task"]["title"] == "Water plants"
+
+        # The next occurrence keeps the reminder offset and the rest of the rule
+        assert run(scheduler, DUE) == 1
+        event = subscriber.queue.get_nowait()
+        assert event["type"] == "task.created"
+        assert event["task"]["due_at"] == "2030-01-08T09:00:00"
+        assert event["task"]["remind_at"] == "2030-01-08T08:00:00"
+        assert event["task"]["recurrence"] is None
+
+    tasks = client.get("/tasks/", headers=auth_headers).json()
+    assert len(tasks) == 2
+    assert all(task["recurrence"] is None for task in tasks)
+    assert run(scheduler, DUE + timedelta(days=7)) == 1
+    assert run(scheduler, DUE + timedelta(days=30)) == 0
+
+
+def test_sent_reminder_leaves_task_unchanged(session_factory, client, auth_headers):
+    """Test that sending a reminder keeps ETags and the change feed valid."""
+    task = client.post(
+        "/tasks/",
+        json={"title": "Call back", "remind_at": DUE.isoformat()},
+        headers=auth_headers,
+    ).json()
+    list_etag = client.get("/tasks/", headers=auth_headers).headers["ETag"]
+    task_etag = client.get(f"/tasks/{task['id']}", headers=auth_headers).headers["ETag"]
+    cursor = client.get("/tasks/changes", headers=auth_headers).json()["cursor"]
+
+    assert run(Scheduler(session_factory), DUE) == 1
+
+    for url, etag in (("/tasks/", list_etag), (f"/tasks/{task['id']}", task_etag)):
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+    changes = client.get(
+        "/tasks/changes", params={"since": cursor}, headers=auth_headers
+    ).json()
+    assert changes["changes"] == []
+    current = client.get(f"/tasks/{task['id']}", headers=auth_headers).json()
+    assert current["updated_at"] == task["updated_at"]
+
+
+def test_scheduler_drains_backlog_in_batches(session_factory, client, auth_headers):
+    """Test that work missed while no scheduler ran fires on the first pass."""
+    batch = {
+        "create": [
+            {
+                "title": f"Task {i}",
+                "remind_at": (DUE + timedelta(minutes=i)).isoformat(),
+            }
+            for i in range(7)
+        ]
+    }
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+
+    scheduler = Scheduler(session_factory, batch_size=2)
+    assert run(scheduler, DUE + timedelta(days=1)) == 7
+    assert run(scheduler, DUE + timedelta(days=2)) == 0
+
+
+def test_scheduler_lease(session_factory, client, auth_headers):
+    """Test that only the lease holder fires, and that the lease fails over."""
+    client.post(
+        "/tasks/",
+        json={"title": "Once", "remind_at": DUE.isoformat()},
+        headers=auth_headers,
+    )
+    first = Scheduler(session_factory, owner="first", lease_ttl=30)
+    second = Scheduler(session_factory, owner="second", lease_ttl=30)
+
+    assert run(first, DUE - timedelta(seconds=10)) == 0
+    assert run(second, DUE) == 0
+    # The first one stopped renewing, its lease expires
+    assert run(second, DUE + timedelta(seconds=31)) == 1
+    assert run(first, DUE + timedelta(seconds=40)) == 0
@@ -0,0 +1,70 @@
+import os
+import pytest
+from src.todo_api import auth_utils, shared
+from src.todo_api.serve import _share_secret_key, available_cpus
+from src.todo_api.shared import MemoryState, RedisState
+
+
+class FakeRedis:
+    """The few Redis commands RedisState uses, in memory."""
+
+    def __init__(self):
+        self.data: dict[str, str] = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+
+@pytest.fixture(params=["memory", "redis"])
+def state(request):
+    if request.param == "memory":
+        return MemoryState()
+    return RedisState(client=FakeRedis())
+
+
+def test_shared_state(state):
+    assert state.get("missing") is None
+    assert state.add("key", "value")
+    assert not state.add("key", "other")
+    assert state.get("key") == "value"
+
+
+def test_secret_key_from_external_state(monkeypatch):
+    """Test that workers sharing external state agree on the signing key."""
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.delenv("SECRET_KEY_FILE", raising=False)
+    client = FakeRedis()
+    monkeypatch.setattr(shared, "state", RedisState(client=client))
+    key = auth_utils.load_secret_key()
+    # Another worker, with its own connection to the same Redis
+    monkeypatch.setattr(shared, "state", RedisState(client=client))
+    assert auth_utils.load_secret_key() == key
+
+
+def test_available_cpus_honors_cgroup_quota(tmp_path):
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("max 100000\n")
+    unlimited = available_cpus(cpu_max)
+    assert unlimited >= 1
+    assert available_cpus(tmp_path / "missing") == unlimited
+
+    cpu_max.write_text("50000 100000\n")
+    assert available_cpus(cpu_max) == 1
+    cpu_max.write_text(f"{unlimited * 200000} 100000\n")
+    assert available_cpus(cpu_max) == unlimited
+
+
+def test_runner_resolves_the_key_file_for_its_workers(tmp_path, monkeypatch):
+    """Test that the runner hands the key of SECRET_KEY_FILE to its workers."""
+    # The runner exports the key, keep it from leaking into other tests
+    monkeypatch.setattr(os, "environ", os.environ.copy())
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.setenv("SECRET_KEY_FILE", str(tmp_path / "secret_key"))
+    _share_secret_key()
+    assert os.environ["SECRET_KEY"] == (tmp_path / "secret_key").read_text()
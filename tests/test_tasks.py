@@ -0,0 +1,628 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, update
+from src.todo_api import crud, export, fastjson, importer
+from src.todo_api.models import TaskCounter
+from src.todo_api.schemas import TaskBatch
+
+
+def test_get_tasks_paginates_with_cursor(client, auth_headers):
+    """Test walking the task list page by page with the next cursor."""
+    for i in range(5):
+        client.post("/tasks/", json={"title": f"Task {i}"}, headers=auth_headers)
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/tasks/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(task["id"] for task in page)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            break
+        params["cursor"] = next_cursor
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+    # Most recently updated first
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_get_tasks_filters_by_status(client, auth_headers):
+    """Test filtering the task list by status."""
+    client.post("/tasks/", json={"title": "Todo"}, headers=auth_headers)
+    client.post(
+        "/tasks/", json={"title": "Finished", "status": "Done"}, headers=auth_headers
+    )
+
+    response = client.get("/tasks/", params={"status": "Done"}, headers=auth_headers)
+    assert response.status_code == 200
+    tasks = response.json()
+    assert [task["title"] for task in tasks] == ["Finished"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_tasks_invalid_cursor(client, auth_headers):
+    """Test that a malformed cursor is rejected."""
+    response = client.get("/tasks/", params={"cursor": "???"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_batch_tasks(client, auth_headers):
+    """Test creating, updating and deleting tasks in one batch."""
+    first = client.post("/tasks/", json={"title": "First"}, headers=auth_headers)
+    second = client.post("/tasks/", json={"title": "Second"}, headers=auth_headers)
+    first_id, second_id = first.json()["id"], second.json()["id"]
+
+    batch = {
+        "create": [{"title": "New 1"}, {"title": "New 2", "status": "Doing"}],
+        "update": [
+            {"id": first_id, "status": "Done"},
+            {"id": 9999, "title": "Missing"},
+        ],
+        "delete": [second_id, 9998],
+    }
+    response = client.post("/tasks/batch", json=batch, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [item["result"] for item in data["create"]] == ["created", "created"]
+    assert [item["task"]["title"] for item in data["create"]] == ["New 1", "New 2"]
+    assert data["create"][1]["task"]["status"] == "Doing"
+
+    assert [item["result"] for item in data["update"]] == ["updated", "not_found"]
+    updated = data["update"][0]["task"]
+    assert updated["title"] == "First"
+    assert updated["status"] == "Done"
+    assert updated["version"] == 2
+    assert updated["updated_at"] > first.json()["updated_at"]
+
+    assert data["delete"] == [
+        {"id": second_id, "result": "deleted", "task": None},
+        {"id": 9998, "result": "not_found", "task": None},
+    ]
+
+    titles = {
+        task["title"] for task in client.get("/tasks/", headers=auth_headers).json()
+    }
+    assert titles == {"First", "New 1", "New 2"}
+
+
+def test_batch_tasks_rejects_conflicting_ids(client, auth_headers):
+    """Test that a batch updating and deleting the same task is rejected."""
+    batch = {"update": [{"id": 1, "title": "x"}], "delete": [1]}
+    response = client.post("/tasks/batch", json=batch, headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_batch_update_rechecks_tasks_written_concurrently(
+    client, auth_headers, created_user, db_session
+):
+    """Test batch updates against tasks changed after the batch read them."""
+    kept = client.post("/tasks/", json={"title": "Kept"}, headers=auth_headers)
+    gone = client.post("/tasks/", json={"title": "Gone"}, headers=auth_headers)
+    kept_id, gone_id = kept.json()["id"], gone.json()["id"]
+
+    def concurrent_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE tasks SET") and not concurrent_writes.done:
+            concurrent_writes.done = True
+            driver = conn.connection.driver_connection
+            driver.execute(
+                "UPDATE tasks SET version = version + 1 WHERE id = ?", (kept_id,)
+            )
+            driver.execute(
+                "UPDATE tasks SET deleted_at = '2030-01-01 00:00:00.000000' "
+                "WHERE id = ?",
+                (gone_id,),
+            )
+
+    concurrent_writes.done = False
+    event.listen(db_session.get_bind(), "before_cursor_execute", concurrent_writes)
+    try:
+        result = crud.apply_task_batch(
+            db_session,
+            created_user["id"],
+            TaskBatch(
+                update=[
+                    {"id": kept_id, "title": "Batch"},
+                    {"id": gone_id, "title": "Batch"},
+                ]
+            ),
+        )
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", concurrent_writes)
+
+    # The version moves on from the concurrent write instead of reusing it
+    assert result.update[0].task.version == 3
+    assert result.update[1].result == "not_found"
+    assert client.get(f"/tasks/{gone_id}", headers=auth_headers).status_code == 404
+
+
+def test_update_task_with_if_match(client, auth_headers):
+    """Test optimistic concurrency on task updates."""
+    task = client.post("/tasks/", json={"title": "Draft"}, headers=auth_headers).json()
+    assert task["version"] == 1
+
+    response = client.put(
+        f"/tasks/{task['id']}",
+        json={"title": "Final"},
+        headers={**auth_headers, "If-Match": '"1"'},
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "Final"
+    assert response.json()["description"] == ""
+    assert response.json()["version"] == 2
+
+    # A writer still holding version 1 loses
+    response = client.put(
+        f"/tasks/{task['id']}",
+        json={"title": "Stale"},
+        headers={**auth_headers, "If-Match": '"1"'},
+    )
+    assert response.status_code == 412
+
+    response = client.delete(
+        f"/tasks/{task['id']}", headers={**auth_headers, "If-Match": '"1"'}
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        f"/tasks/{task['id']}", headers={**auth_headers, "If-Match": '"2"'}
+    )
+    assert response.status_code == 200
+
+
+def test_update_and_delete_are_single_statements(client, auth_headers, sql_statements):
+    """Test that update and delete each take one round trip for task work."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers).json()
+
+    sql_statements.clear()
+    response = client.put(
+        f"/tasks/{task['id']}", json={"status": "Done"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    task_statements = [s.split()[0] for s in sql_statements if " tasks" in s]
+    assert task_statements == ["UPDATE"]
+
+    sql_statements.clear()
+    response = client.delete(f"/tasks/{task['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    # Deleting leaves a tombstone for delta sync
+    task_statements = [s.split()[0] for s in sql_statements if " tasks" in s]
+    assert task_statements == ["UPDATE"]
+
+
+def test_update_missing_task(client, auth_headers):
+    """Test updating a task that does not exist."""
+    response = client.put(
+        "/tasks/9999", json={"title": "x"}, headers={**auth_headers, "If-Match": '"1"'}
+    )
+    assert response.status_code == 404
+
+
+def test_get_tasks_conditional(client, auth_headers, sql_statements):
+    """Test that an unchanged task list is answered with 304."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers).json()
+
+    response = client.get("/tasks/", headers=auth_headers)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    sql_statements.clear()
+    response = client.get("/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert not any(" tasks" in statement for statement in sql_statements)
+
+    # Other query parameters are a different representation
+    response = client.get(
+        "/tasks/", params={"limit": 1}, headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+
+    # Any mutation changes the ETag
+    client.put(f"/tasks/{task['id']}", json={"status": "Done"}, headers=auth_headers)
+    response = client.get("/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_get_task_conditional(client, auth_headers):
+    """Test conditional GET of a single task."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers).json()
+
+    response = client.get(f"/tasks/{task['id']}", headers=auth_headers)
+    etag = response.headers["ETag"]
+    response = client.get(
+        f"/tasks/{task['id']}", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    client.delete(f"/tasks/{task['id']}", headers=auth_headers)
+    response = client.get(
+        f"/tasks/{task['id']}", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 404
+
+
+def test_task_etag_is_accepted_by_if_match(client, auth_headers):
+    """Test that the ETag of a task read can condition the next write."""
+    response = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers)
+    task_id = response.json()["id"]
+    assert response.headers["ETag"] == '"1"'
+
+    etag = client.get(f"/tasks/{task_id}", headers=auth_headers).headers["ETag"]
+    response = client.put(
+        f"/tasks/{task_id}",
+        json={"title": "Renamed"},
+        headers={**auth_headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    updated_etag = response.headers["ETag"]
+    assert updated_etag != etag
+
+    response = client.delete(
+        f"/tasks/{task_id}", headers={**auth_headers, "If-Match": etag}
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        f"/tasks/{task_id}", headers={**auth_headers, "If-Match": updated_etag}
+    )
+    assert response.status_code == 200
+
+
+def test_task_changes_since_cursor(client, auth_headers):
+    """Test that the change feed returns only what changed since a cursor."""
+    kept = client.post("/tasks/", json={"title": "Kept"}, headers=auth_headers)
+    gone = client.post("/tasks/", json={"title": "Gone"}, headers=auth_headers)
+
+    response = client.get("/tasks/changes", headers=auth_headers)
+    assert response.status_code == 200
+    feed = response.json()
+    assert [change["id"] for change in feed["changes"]] == [
+        kept.json()["id"],
+        gone.json()["id"],
+    ]
+    assert feed["has_more"] is False
+
+    client.put(
+        f"/tasks/{kept.json()['id']}", json={"status": "Done"}, headers=auth_headers
+    )
+    client.delete(f"/tasks/{gone.json()['id']}", headers=auth_headers)
+
+    response = client.get(
+        "/tasks/changes", params={"since": feed["cursor"]}, headers=auth_headers
+    )
+    changes = response.json()["changes"]
+    assert [(c["id"], c["deleted"]) for c in changes] == [
+        (kept.json()["id"], False),
+        (gone.json()["id"], True),
+    ]
+    assert changes[0]["task"]["status"] == "Done"
+    assert changes[1]["task"] is None
+
+    # Deleted tasks are gone from regular reads
+    tasks = client.get("/tasks/", headers=auth_headers).json()
+    assert [task["id"] for task in tasks] == [kept.json()["id"]]
+    response = client.get(f"/tasks/{gone.json()['id']}", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_task_changes_pages_through_batch(client, auth_headers):
+    """Test paging through changes that share a change_seq."""
+    batch = {"create": [{"title": f"Task {i}"} for i in range(5)]}
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+
+    seen, params = [], {"limit": 2}
+    while True:
+        feed = client.get("/tasks/changes", params=params, headers=auth_headers)
+        feed = feed.json()
+        seen.extend(change["id"] for change in feed["changes"])
+        params["since"] = feed["cursor"]
+        if not feed["has_more"]:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+
+def test_purged_tombstones_expire_old_cursors(client, auth_headers, db_session):
+    """Test that cursors older than purged tombstones must resync."""
+    task = client.post("/tasks/", json={"title": "Task"}, headers=auth_headers)
+    cursor = client.get("/tasks/changes", headers=auth_headers).json()["cursor"]
+    client.delete(f"/tasks/{task.json()['id']}", headers=auth_headers)
+
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    assert crud.purge_tombstones(db_session, future) == 1
+
+    response = client.get(
+        "/tasks/changes", params={"since": cursor}, headers=auth_headers
+    )
+    assert response.status_code == 410
+
+    # A full resync no longer lists the tombstone, and its cursor stays valid
+    feed = client.get("/tasks/changes", headers=auth_headers).json()
+    assert feed["changes"] == []
+    response = client.get(
+        "/tasks/changes", params={"since": feed["cursor"]}, headers=auth_headers
+    )
+    assert response.status_code == 200
+
+
+def test_search_tasks(client, auth_headers):
+    """Test ranked full-text search that follows task changes."""
+    batch = {
+        "create": [
+            {"title": "Buy groceries", "description": "Milk and bread"},
+            {"title": "Call plumber", "description": "Ask about the groceries bill"},
+            {"title": "Read book", "description": "Chapter 3", "status": "Done"},
+        ]
+    }
+    created = client.post("/tasks/batch", json=batch, headers=auth_headers).json()
+    ids = [item["id"] for item in created["create"]]
+
+    response = client.get(
+        "/tasks/search", params={"q": "groceries"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    results = response.json()
+    # A title match outranks a description match
+    assert [result["task"]["id"] for result in results] == ids[:2]
+    assert results[0]["rank"] > results[1]["rank"]
+    assert results[0]["title_highlight"] == "Buy <mark>groceries</mark>"
+
+    # The index follows updates and deletes
+    client.put(f"/tasks/{ids[0]}", json={"title": "Buy fruit"}, headers=auth_headers)
+    client.delete(f"/tasks/{ids[1]}", headers=auth_headers)
+    results = client.get(
+        "/tasks/search", params={"q": "groceries"}, headers=auth_headers
+    ).json()
+    assert results == []
+
+    # Combined with the status filter, and user input is not query syntax
+    results = client.get(
+        "/tasks/search",
+        params={"q": 'book "OR', "status": "Done"},
+        headers=auth_headers,
+    ).json()
+    assert results == []
+    results = client.get(
+        "/tasks/search", params={"q": "book", "status": "Done"}, headers=auth_headers
+    ).json()
+    assert [result["task"]["id"] for result in results] == [ids[2]]
+
+
+def test_search_highlights_escape_task_text(client, auth_headers):
+    """Test that only the match markers in search highlights are HTML."""
+    client.post(
+        "/tasks/",
+        json={
+            "title": "<img src=x onerror=alert(1)> report",
+            "description": "<script>alert(1)</script> & the report",
+        },
+        headers=auth_headers,
+    )
+
+    results = client.get(
+        "/tasks/search", params={"q": "report"}, headers=auth_headers
+    ).json()
+    assert results[0]["title_highlight"] == (
+        "&lt;img src=x onerror=alert(1)&gt; <mark>report</mark>"
+    )
+    assert results[0]["description_highlight"] == (
+        "&lt;script&gt;alert(1)&lt;/script&gt; &amp; the <mark>report</mark>"
+    )
+    assert results[0]["task"]["title"] == "<img src=x onerror=alert(1)> report"
+
+
+def test_get_tasks_fast_json_matches_models(client, auth_headers, monkeypatch):
+    """Test that the column-tuple fast path returns the same document."""
+    batch = {
+        "create": [
+            {"title": f"Task {i}", "description": "x" * i, "status": status}
+            for i, status in enumerate(["To do", "Doing", "Done", "Cancelled"])
+        ]
+    }
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+    params = {"limit": 3}
+
+    monkeypatch.setattr(fastjson, "enabled", False)
+    slow = client.get("/tasks/", params=params, headers=auth_headers)
+    monkeypatch.setattr(fastjson, "enabled", True)
+    fast = client.get("/tasks/", params=params, headers=auth_headers)
+
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == slow.json()
+    for name in ("ETag", "Cache-Control", "X-Next-Cursor"):
+        assert fast.headers[name] == slow.headers[name]
+
+
+def test_export_tasks(client, auth_headers, monkeypatch):
+    """Test streaming every task as NDJSON and CSV, across partitions."""
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    batch = {"create": [{"title": f"Task {i}", "status": "Done"} for i in range(5)]}
+    client.post("/tasks/batch", json=batch, headers=auth_headers)
+    client.delete("/tasks/1", headers=auth_headers)
+    tasks = {
+        task["id"]: task for task in client.get("/tasks/", headers=auth_headers).json()
+    }
+
+    response = client.get(
+        "/tasks/export", headers={**auth_headers, "Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [tasks[task_id] for task_id in sorted(tasks)]
+
+    response = client.get(
+        "/tasks/export", params={"format": "csv"}, headers=auth_headers
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == sorted(tasks)
+    assert rows[0]["status"] == "Done"
+    assert rows[0]["updated_at"] == tasks[2]["updated_at"]
+
+
+def test_import_tasks_ndjson(client, auth_headers, monkeypatch):
+    """Test importing NDJSON in chunks, keeping valid lines and reporting others."""
+    monkeypatch.setattr(importer, "IMPORT_CHUNK_SIZE", 2)
+    body = b"\n".join(
+        [
+            b'{"title": "One"}',
+            b'{"title": "Two", "status": "Done"}',
+            b"not json",
+            b"",
+            b'{"description": "no title"}',
+            b'{"title": "Three", "description": "desc"}',
+        ]
+    )
+    response = client.post(
+        "/tasks/import",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["accepted"] == 3
+    assert summary["rejected"] == 2
+    assert [error["line"] for error in summary["errors"]] == [3, 5]
+    assert summary["errors"][1]["error"].startswith("title:")
+
+    tasks = client.get("/tasks/", headers=auth_headers).json()
+    assert sorted(task["title"] for task in tasks) == ["One", "Three", "Two"]
+    # Imported tasks show up in the change feed
+    feed = client.get("/tasks/changes", headers=auth_headers).json()
+    assert len(feed["changes"]) == 3
+
+
+def test_import_tasks_csv_round_trip(client, auth_headers):
+    """Test that a CSV export can be imported back."""
+    client.post(
+        "/tasks/",
+        json={"title": "Quoted, title", "description": 'Line 1\nLine "2"'},
+        headers=auth_headers,
+    )
+    client.post(
+        "/tasks/",
+        json={"title": "Due", "due_at": "2030-01-01T09:00:00"},
+        headers=auth_headers,
+    )
+    exported = client.get(
+        "/tasks/export", params={"format": "csv"}, headers=auth_headers
+    )
+
+    response = client.post(
+        "/tasks/import",
+        content=exported.content,
+        headers={**auth_headers, "Content-Type": "text/csv"},
+    )
+    assert response.json() == {"accepted": 2, "rejected": 0, "errors": []}
+    tasks = client.get("/tasks/", headers=auth_headers).json()
+    descriptions = [task["description"] for task in tasks]
+    assert descriptions.count('Line 1\nLine "2"') == 2
+    assert [task["due_at"] for task in tasks].count("2030-01-01T09:00:00") == 2
+
+    response = client.post(
+        "/tasks/import",
+        content=b"{}",
+        headers={**auth_headers, "Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+def test_import_tasks_with_byte_order_mark(client, auth_headers):
+    """Test that a byte order mark before the first record is ignored."""
+    for content_type, body in (
+        ("text/csv", "title,status\nSpreadsheet,Done\n"),
+        ("application/x-ndjson", '{"title": "Editor"}\n'),
+    ):
+        response = client.post(
+            "/tasks/import",
+            content=body.encode("utf-8-sig"),
+            headers={**auth_headers, "Content-Type": content_type},
+        )
+        assert response.json() == {"accepted": 1, "rejected": 0, "errors": []}
+    tasks = client.get("/tasks/", headers=auth_headers).json()
+    assert sorted(task["title"] for task in tasks) == ["Editor", "Spreadsheet"]
+
+
+def test_import_rejects_overlong_fields(client, auth_headers):
+    """Test that text longer than its column is rejected per line."""
+    body = "\n".join(
+        json.dumps(task)
+        for task in (
+            {"title": "x" * 201},
+            {"title": "Fits", "description": "x" * 1000},
+            {"title": "Long", "description": "x" * 1001},
+        )
+    )
+    response = client.post(
+        "/tasks/import",
+        content=body.encode(),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    summary = response.json()
+    assert summary["accepted"] == 1
+    assert summary["rejected"] == 2
+    assert [error["line"] for error in summary["errors"]] == [1, 3]
+    assert summary["errors"][0]["error"].startswith("title:")
+    assert summary["errors"][1]["error"].startswith("description:")
+
+    task = client.post("/tasks/", json={"title": "Ok"}, headers=auth_headers).json()
+    response = client.put(
+        f"/tasks/{task['id']}", json={"title": "x" * 201}, headers=auth_headers
+    )
+    assert response.status_code == 422
+
+
+def test_task_stats(client, auth_headers, db_session, sql_statements):
+    """Test counts per status kept up to date by every kind of write."""
+    batch = {
+        "create": [{"title": "A"}, {"title": "B"}, {"title": "C", "status": "Done"}]
+    }
+    ids = [
+        item["id"]
+        for item in client.post(
+            "/tasks/batch", json=batch, headers=auth_headers
+        ).json()["create"]
+    ]
+    client.put(f"/tasks/{ids[0]}", json={"status": "Done"}, headers=auth_headers)
+    client.put(f"/tasks/{ids[1]}", json={"status": "Doing"}, headers=auth_headers)
+    client.delete(f"/tasks/{ids[2]}", headers=auth_headers)
+    client.post(
+        "/tasks/import",
+        content=b'{"title": "D", "status": "Cancelled"}',
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+
+    sql_statements.clear()
+    response = client.get("/tasks/stats", params={"days": 3}, headers=auth_headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total"] == 3
+    assert stats["by_status"] == {"To do": 0, "Doing": 1, "Done": 1, "Cancelled": 1}
+    assert [day["count"] for day in stats["completed"]] == [0, 0, 2]
+    assert (
+        stats["completed"][-1]["day"] == datetime.now(timezone.utc).date().isoformat()
+    )
+    # Read from the counters, not by scanning tasks
+    assert not any(" tasks" in statement for statement in sql_statements)
+
+    response = client.get(
+        "/tasks/stats",
+        params={"days": 3},
+        headers={**auth_headers, "If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+    # Drifted counters are rebuilt from the tasks table
+    db_session.execute(update(TaskCounter).values(count=42))
+    db_session.commit()
+    assert crud.reconcile_task_counters(db_session) == 3
+    stats = client.get("/tasks/stats", headers=auth_headers).json()
+    assert stats["by_status"] == {"To do": 0, "Doing": 1, "Done": 1, "Cancelled": 1}